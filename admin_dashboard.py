@@ -18,14 +18,9 @@ import cv2
 import numpy as np
 from PIL import Image
 
-# Import our existing analysis modules
-from tracking import detect_human
-from yolov8_detector import YOLOv8Detector
-from deep_sort import nn_matching
-from deep_sort.detection import Detection
-from deep_sort.tracker import Tracker
-from deep_sort import generate_detections as gdet
-from util import kinetic_energy
+# Thread pools are sized before the analysis modules load any model
+from autotune import apply_thread_config
+apply_thread_config()
 
 class AdminDashboard(QMainWindow):
     def __init__(self):
@@ -0,0 +1,176 @@
+from config import THREAD_CONFIG, TUNE_CONFIG, CPU_CONFIG, FRAME_SIZE
+
+import os
+import re
+import time
+import tempfile
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import cv2
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.py")
+# Thread settings tuned in this order, one at a time
+THREAD_KEYS = ["TORCH_THREADS", "TORCH_INTEROP_THREADS", "TF_THREADS", "CV2_THREADS"]
+
+# Thread settings of this process
+_thread_profile = dict(THREAD_CONFIG)
+
+
+def apply_thread_config(profile=None):
+    """Use the thread counts of `THREAD_CONFIG`, or of `profile` if given, in
+    this process. Must run at startup, before any model is loaded. OpenCV is
+    set right away; PyTorch and TensorFlow get theirs when the models are
+    loaded by `model_registry`, so startup does not import them. A value of
+    0 keeps the library default.
+    """
+    global _thread_profile
+    _thread_profile = dict(profile or THREAD_CONFIG)
+    if _thread_profile["CV2_THREADS"] > 0:
+        cv2.setNumThreads(_thread_profile["CV2_THREADS"])
+
+
+def thread_config():
+    return _thread_profile
+
+
+def apply_torch_threads():
+    # Called before the detector is loaded
+    import torch
+    if _thread_profile["TORCH_THREADS"] > 0:
+        torch.set_num_threads(_thread_profile["TORCH_THREADS"])
+    if _thread_profile["TORCH_INTEROP_THREADS"] > 0:
+        try:
+            torch.set_num_interop_threads(_thread_profile["TORCH_INTEROP_THREADS"])
+        except RuntimeError as e:
+            # Only possible before PyTorch has started its thread pool
+            print("WARNING: Thread settings not applied: {}".format(e))
+
+
+def _benchmark(task):
+    # Runs in a fresh process, thread pools can only be sized once per process
+    (frames_file, profile, img_size, batch_size) = task
+    apply_thread_config(profile)
+    from model_registry import load_detector, load_encoder
+
+    frames = np.load(frames_file)
+    detector = load_detector(img_size=img_size)
+    encoder = load_encoder()
+
+    # Warm up
+    for frame, detections in zip(frames[:batch_size], detector.detect_batch(list(frames[:batch_size]))):
+        encoder(frame, detections["tlwh"])
+
+    count = 0
+    start = time.time()
+    for i in range(0, len(frames), batch_size):
+        batch = list(frames[i:i + batch_size])
+        for frame, detections in zip(batch, detector.detect_batch(batch)):
+            count += len(detections)
+            if len(detections) > 0:
+                encoder(frame, detections["tlwh"])
+    return len(frames) / (time.time() - start), count
+
+
+def _thread_choices(default=False):
+    cores = os.cpu_count() or 1
+    choices = sorted({n for n in (1, 2, 4, 8, cores // 2, cores) if 0 < n <= cores})
+    return [0] + choices if default else choices
+
+
+def _sample_frames(video, count):
+    # Consecutive processed frames, like the pipeline sees them
+    from video_reader import FrameReader, resize_to_width
+    cap = cv2.VideoCapture(video)
+    reader = FrameReader(cap, CPU_CONFIG["FRAME_SKIP"], False)
+    frames = []
+    while len(frames) < count:
+        (ret, frame, _) = reader.read()
+        if not ret:
+            break
+        frames.append(resize_to_width(frame, FRAME_SIZE))
+    cap.release()
+    if not frames:
+        raise ValueError("Could not read frames from {}".format(video))
+    return np.stack(frames)
+
+
+def write_config(updates):
+    """Replace values in config.py. `updates` maps a config dict name to the
+    keys and values to set in it.
+    """
+    with open(CONFIG_FILE) as config_file:
+        text = config_file.read()
+    for section, values in updates.items():
+        for key, value in values.items():
+            pattern = re.compile(r'(^%s = \{[^}]*?^\s*"%s"\s*:\s*)([^,#\n]+?)(?=\s*[,#\n])' % (section, key), re.M)
+            (text, n) = pattern.subn(lambda m: m.group(1) + repr(value), text, count=1)
+            if n == 0:
+                raise KeyError("{}[\"{}\"] not found in {}".format(section, key, CONFIG_FILE))
+    with open(CONFIG_FILE, "w") as config_file:
+        config_file.write(text)
+
+
+def autotune():
+    """Benchmark thread counts, inference size and batch size on this machine,
+    one setting at a time, keeping the fastest value of each. Returns the
+    best setting.
+    """
+    frames = _sample_frames(TUNE_CONFIG["VIDEO"], TUNE_CONFIG["FRAMES"])
+    (fd, frames_file) = tempfile.mkstemp(suffix=".npy")
+    os.close(fd)
+    np.save(frames_file, frames)
+
+    results = {}
+    def run(setting):
+        key = tuple(sorted(setting.items()))
+        if key not in results:
+            profile = {k: setting[k] for k in THREAD_KEYS}
+            task = (frames_file, profile, setting["IMG_SIZE"], setting["DETECT_BATCH"])
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                results[key] = pool.submit(_benchmark, task).result()
+            print("{}: {:.2f} FPS, {} detections".format(
+                ", ".join("{}={}".format(k, v) for k, v in setting.items()), *results[key]))
+        return results[key]
+
+    # The largest inference size gives the reference detection count
+    img_sizes = sorted(set(TUNE_CONFIG["IMG_SIZES"]), reverse=True)
+    best = dict(THREAD_CONFIG, IMG_SIZE=img_sizes[0], DETECT_BATCH=CPU_CONFIG["DETECT_BATCH"])
+    try:
+        (best_fps, reference_count) = run(best)
+        candidates = [(key, _thread_choices(default=key != "TORCH_THREADS")) for key in THREAD_KEYS]
+        candidates += [("DETECT_BATCH", TUNE_CONFIG["BATCH_SIZES"]), ("IMG_SIZE", img_sizes)]
+        for key, values in candidates:
+            for value in values:
+                setting = dict(best, **{key: value})
+                (fps, count) = run(setting)
+                # Smaller inference sizes miss small people, keep enough of them
+                if count < TUNE_CONFIG["MIN_DETECTION_RATIO"] * reference_count:
+                    continue
+                if fps > best_fps:
+                    (best, best_fps) = (setting, fps)
+    finally:
+        os.remove(frames_file)
+
+    print("\nBest setting: {:.2f} FPS".format(best_fps))
+    for key, value in best.items():
+        print("  {}: {}".format(key, value))
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune thread counts, inference size and batch size")
+    parser.add_argument("--no-write", action="store_true", help="Only print the best setting")
+    args = parser.parse_args()
+
+    print("Autotuning on {} ({} frames per run, {} CPU cores)".format(
+        TUNE_CONFIG["VIDEO"], TUNE_CONFIG["FRAMES"], os.cpu_count()))
+    best = autotune()
+    if not args.no_write:
+        write_config({
+            "THREAD_CONFIG": {key: best[key] for key in THREAD_KEYS},
+            "YOLO_CONFIG": {"IMG_SIZE": best["IMG_SIZE"]},
+            "CPU_CONFIG": {"DETECT_BATCH": best["DETECT_BATCH"]}
+        })
+        print("Written to {}".format(CONFIG_FILE))
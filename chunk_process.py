@@ -0,0 +1,277 @@
+from config import CHUNK_CONFIG, VIDEO_CONFIG, DATA_RECORD_RATE, FRAME_SIZE, TRACK_MAX_AGE, CPU_CONFIG, THREAD_CONFIG
+
+import datetime
+import time
+import os
+import csv
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil, lcm
+import numpy as np
+import cv2
+from scipy.optimize import linear_sum_assignment
+from deep_sort.iou_matching import iou
+from tracking import MAX_COSINE_DISTANCE
+from util import fixed_rate_positions
+
+FRAME_SKIP = CPU_CONFIG["FRAME_SKIP"]
+
+# Minimum mean IOU over the overlap window for two tracks to be the same person
+STITCH_MIN_IOU = 0.3
+
+
+class _RowBuffer:
+    # Collects rows in memory, used in place of a csv writer
+    def __init__(self):
+        self.rows = []
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+
+def _record_track(tracks, track, frame_count):
+    rec = tracks.get(track.track_id)
+    if rec is None:
+        rec = tracks[track.track_id] = {
+            "entry": track.entry,
+            "exit": None,
+            "open": False,
+            "confirmed": False,
+            "frames": [],
+            "positions": [],
+            "boxes": [],
+            "feature": None
+        }
+    # A new position is added on every measurement update
+    if len(track.positions) > len(rec["positions"]):
+        rec["frames"].append(frame_count)
+        rec["positions"].append([int(v) for v in track.positions[-1]])
+        rec["boxes"].append(track.to_tlwh())
+        if track.last_feature is not None:
+            feature = track.last_feature / np.linalg.norm(track.last_feature)
+            rec["feature"] = feature if rec["feature"] is None else rec["feature"] + feature
+    rec["confirmed"] = rec["confirmed"] or track.is_confirmed()
+
+
+def _process_chunk(task):
+    """Process frames `(start - warmup, end]` of the video in a worker
+    process. Crowd data is only kept for frames after `start`; the warm-up
+    frames give the tracker history and are used to stitch tracks with the
+    previous chunk.
+    """
+    (start, end, warmup, stride, threads) = task
+
+    # Models are loaded in the worker, one set per process, and the cores are split between workers
+    from autotune import apply_thread_config
+    apply_thread_config(dict(THREAD_CONFIG, TORCH_THREADS=threads, TF_THREADS=threads, CV2_THREADS=threads))
+    import imutils
+    from tracking import detect_human, create_tracker
+    from video_process import new_analysis_state, analyse_frame
+    from video_reader import FrameReader
+    from roi import RegionOfInterest
+    from model_registry import get_encoder
+
+    encoder = get_encoder()
+    # Same tracker as a sequential run of main.py
+    tracker = create_tracker(False)
+
+    cap = cv2.VideoCapture(VIDEO_CONFIG["VIDEO_CAP"])
+    vid_fps = cap.get(cv2.CAP_PROP_FPS)
+    time_step = int(vid_fps / DATA_RECORD_RATE) / vid_fps
+    first = max(0, start - warmup)
+    if first > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    reader = FrameReader(cap, stride, False)
+
+    roi = RegionOfInterest(VIDEO_CONFIG["ROI"]) if VIDEO_CONFIG["ROI"] else None
+
+    frame_count = first
+    tracks = {}
+    crowd_data = _RowBuffer()
+    state = new_analysis_state()
+    while True:
+        (ret, frame, consumed) = reader.read()
+        frame_count += consumed
+        if not ret or (end is not None and frame_count > end):
+            break
+        frame = imutils.resize(frame, width=FRAME_SIZE)
+
+        [humans_detected, expired] = detect_human(None, None, frame, encoder, tracker, frame_count, roi)
+        for track in tracker.tracks:
+            _record_track(tracks, track, frame_count)
+        for track in expired:
+            _record_track(tracks, track, frame_count)
+            tracks[track.track_id]["exit"] = track.exit
+
+        analyse_frame(frame, humans_detected, datetime.datetime.now(), frame_count, time_step, state, crowd_data)
+
+    # Tracks still alive at the end of the chunk
+    last_frame = frame_count if end is None else min(frame_count, end)
+    for track in tracker.tracks:
+        if track.is_confirmed():
+            tracks[track.track_id]["exit"] = last_frame
+            tracks[track.track_id]["open"] = True
+    cap.release()
+
+    return {
+        "crowd_data": [row for row in crowd_data.rows if row[0] > start],
+        "tracks": [t for t in tracks.values() if t["confirmed"] and t["exit"] is not None],
+        "frame_count": frame_count
+    }
+
+
+def _trim(track, start):
+    # Keep only the part of a track after `start`
+    keep = [i for i, f in enumerate(track["frames"]) if f > start]
+    return [track["frames"][i] for i in keep], [track["positions"][i] for i in keep], \
+        [track["boxes"][i] for i in keep]
+
+
+def _match_tracks(prev_tracks, next_tracks, low, high):
+    """Match tracks that end a chunk with tracks that start the next one,
+    using box overlap on the shared frames `(low, high]` and appearance.
+    """
+    if len(prev_tracks) == 0 or len(next_tracks) == 0:
+        return []
+    cost_matrix = np.full((len(prev_tracks), len(next_tracks)), np.inf)
+    for i, prev in enumerate(prev_tracks):
+        prev_boxes = {f: b for f, b in zip(prev["frames"], prev["boxes"]) if low < f <= high}
+        for j, nxt in enumerate(next_tracks):
+            common = [(prev_boxes[f], b) for f, b in zip(nxt["frames"], nxt["boxes"]) if f in prev_boxes]
+            if len(common) == 0:
+                continue
+            overlap = np.mean([iou(a, b[None, :])[0] for a, b in common])
+            if overlap < STITCH_MIN_IOU:
+                continue
+            appearance = 0.
+            if prev["feature"] is not None and nxt["feature"] is not None:
+                a = prev["feature"] / np.linalg.norm(prev["feature"])
+                b = nxt["feature"] / np.linalg.norm(nxt["feature"])
+                appearance = 1. - np.dot(a, b)
+                if appearance > MAX_COSINE_DISTANCE:
+                    continue
+            cost_matrix[i, j] = (1. - overlap) + appearance
+
+    feasible = np.isfinite(cost_matrix)
+    cost_matrix[~feasible] = 1e+5
+    rows, cols = linear_sum_assignment(cost_matrix)
+    return [(prev_tracks[i], next_tracks[j]) for i, j in zip(rows, cols) if feasible[i, j]]
+
+
+def stitch_chunks(results, starts, warmup):
+    """Join the tracks of consecutive chunks into one set of movement tracks."""
+    stitched = []
+    prev_tracks = []
+    for k, result in enumerate(results):
+        start = starts[k]
+        tracks = result["tracks"]
+        matched = set()
+        if k > 0:
+            candidates = [t for t in prev_tracks if t["open"] or t["exit"] > start - warmup]
+            warm = [t for t in tracks if t["frames"] and t["frames"][0] <= start]
+            for prev, nxt in _match_tracks(candidates, warm, start - warmup, start):
+                frames, positions, boxes = _trim(nxt, start)
+                prev["frames"] += frames
+                prev["positions"] += positions
+                prev["boxes"] += boxes
+                prev["exit"] = nxt["exit"]
+                prev["open"] = nxt["open"]
+                if nxt["feature"] is not None:
+                    prev["feature"] = nxt["feature"] if prev["feature"] is None else prev["feature"] + nxt["feature"]
+                matched.add(id(nxt))
+                matched.add(id(prev))
+            # Open tracks of the previous chunk that were not continued end here
+            for prev in prev_tracks:
+                if id(prev) not in matched:
+                    prev["open"] = False
+
+        current = [t for t in prev_tracks if id(t) in matched]
+        for track in tracks:
+            if id(track) in matched:
+                continue
+            if k > 0:
+                # The warm-up part belongs to the previous chunk
+                track["frames"], track["positions"], track["boxes"] = _trim(track, start)
+                if len(track["frames"]) == 0:
+                    continue
+                track["entry"] = track["frames"][0]
+            stitched.append(track)
+            current.append(track)
+        prev_tracks = current
+
+    # Number the tracks in order of appearance, like the tracker does
+    stitched.sort(key=lambda t: (t["entry"], t["frames"][0]))
+    for track_id, track in enumerate(stitched, start=1):
+        track["track_id"] = track_id
+    # Tracks that expired come first in exit order, then the ones alive at the end
+    stitched.sort(key=lambda t: (t["open"], t["exit"]))
+    return stitched
+
+
+def chunk_process(video_cap, workers, chunk_sec, overlap_sec):
+    cap = cv2.VideoCapture(video_cap)
+    vid_fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    data_record_frame = int(vid_fps / DATA_RECORD_RATE)
+    stride = lcm(FRAME_SKIP, data_record_frame)
+    # Chunk boundaries and overlap are aligned to processed frames so that
+    # every chunk processes the same frame numbers as a sequential run
+    chunk_len = max(1, round(chunk_sec * vid_fps / stride)) * stride
+    warmup = max(1, ceil(overlap_sec * vid_fps / stride)) * stride
+    starts = list(range(0, total_frames, chunk_len))
+    ends = starts[1:] + [None]
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    print(f"Splitting {total_frames} frames into {len(starts)} chunks on {workers} workers")
+    tasks = [(s, e, warmup, stride, threads) for s, e in zip(starts, ends)]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        results = list(pool.map(_process_chunk, tasks))
+
+    crowd_data = [row for result in results for row in result["crowd_data"]]
+    movement_data = stitch_chunks(results, starts, warmup)
+    return crowd_data, movement_data, results[-1]["frame_count"], vid_fps, data_record_frame
+
+
+if __name__ == "__main__":
+    workers = CHUNK_CONFIG["WORKERS"] or os.cpu_count() or 1
+    print("Starting chunked Crowd-Analysis with YOLOv8...")
+    print(f"Processing video: {VIDEO_CONFIG['VIDEO_CAP']}")
+
+    START_TIME = time.time()
+    crowd_data, movement_data, frame_count, VID_FPS, DATA_RECORD_FRAME = chunk_process(
+        VIDEO_CONFIG["VIDEO_CAP"], workers, CHUNK_CONFIG["CHUNK_SEC"], CHUNK_CONFIG["OVERLAP_SEC"])
+    PROCESS_TIME = time.time() - START_TIME
+    print("Time elapsed: ", PROCESS_TIME)
+    print("Processed FPS: ", round(frame_count / PROCESS_TIME, 2))
+
+    os.makedirs('processed_data', exist_ok=True)
+    with open('processed_data/movement_data.csv', 'w') as movement_data_file:
+        movement_data_writer = csv.writer(movement_data_file)
+        movement_data_writer.writerow(['Track ID', 'Entry time', 'Exit Time', 'Movement Tracks'])
+        for track in movement_data:
+            # One position every DATA_RECORD_FRAME frames, like video_process
+            positions = fixed_rate_positions(track["positions"], track["frames"], DATA_RECORD_FRAME)
+            positions = list(np.array(positions).flatten())
+            movement_data_writer.writerow([track["track_id"], track["entry"], track["exit"]] + positions)
+    with open('processed_data/crowd_data.csv', 'w') as crowd_data_file:
+        crowd_data_writer = csv.writer(crowd_data_file)
+        crowd_data_writer.writerow(['Time', 'Human Count', 'Social Distance violate', 'Restricted Entry', 'Abnormal Activity'])
+        for row in crowd_data:
+            crowd_data_writer.writerow(row)
+
+    START_TIME = VIDEO_CONFIG["START_TIME"]
+    END_TIME = START_TIME + datetime.timedelta(seconds=round(frame_count / VID_FPS))
+    video_data = {
+        "IS_CAM": False,
+        "DATA_RECORD_FRAME" : DATA_RECORD_FRAME,
+        "VID_FPS" : VID_FPS,
+        "PROCESSED_FRAME_SIZE": FRAME_SIZE,
+        "TRACK_MAX_AGE": TRACK_MAX_AGE,
+        "START_TIME": START_TIME.strftime("%d/%m/%Y, %H:%M:%S"),
+        "END_TIME": END_TIME.strftime("%d/%m/%Y, %H:%M:%S")
+    }
+    with open('processed_data/video_data.json', 'w') as video_data_file:
+        json.dump(video_data, video_data_file)
@@ -6,19 +6,113 @@ VIDEO_CONFIG = {
     "IS_CAM" : False,
     "CAM_APPROX_FPS": 3,
     "HIGH_CAM": False,
+    "LATEST_FRAME": False,  # For cameras, always process the newest frame and drop the ones in between
+    "ROI": [],  # Detection zones, list of polygons [[x, y], ...] on the resized frame (empty for the whole frame)
     "START_TIME": datetime.datetime(2020, 11, 5, 0, 0, 0, 0)
 }
 
 # YOLOv8 Config (replaces YOLOv4 config)
 YOLO_CONFIG = {
     "MODEL_PATH" : "yolov8n.pt",
-    "DEVICE" : "cpu"
+    "DEVICE" : "cpu",
+    "IMG_SIZE" : 640,  # Inference size, set by autotune.py
+    "BACKEND" : "torch",  # Inference runtime: "torch", "onnx" or "openvino"
+    "PRECISION" : "fp32"  # "int8" runs the quantized ONNX model made by quantize.py
+}
+
+# Appearance feature encoder used by the tracker
+ENCODER_CONFIG = {
+    "MODEL_PATH" : "model_data/mars-small128.pb",
+    "PRECISION" : "fp32",  # "int8" runs the quantized ONNX model made by quantize.py
+    "BACKEND" : "tensorflow"  # "tensorflow", "onnxruntime" or "opencv", the last two convert the model to ONNX once
+}
+
+# INT8 quantization (quantize.py)
+QUANT_CONFIG = {
+    "CALIB_VIDEO" : "test.mp4",  # Video the calibration frames are sampled from
+    "CALIB_DIR" : "model_data/calibration",  # Calibration frames and crops are kept here and reused
+    "CALIB_FRAMES" : 100,  # Number of calibration frames
+    "CALIB_CROPS" : 1000,  # Max number of person crops for the encoder
+    "REPORT_VIDEO" : "test.mp4",  # Clip used to compare INT8 against FP32
+    "REPORT_FRAMES" : 300  # Number of frames of the clip to compare on
 }
 
 # CPU performance optimizations
 CPU_CONFIG = {
     "FRAME_SKIP" : 2,  # Process every 2nd frame
-    "PROCESSING_WIDTH" : 640  # Reduced from 1080 for CPU performance
+    "PROCESSING_WIDTH" : 640,  # Reduced from 1080 for CPU performance
+    "SEEK_MIN_STRIDE" : 30,  # Seek instead of grabbing skipped frames when the stride is at least this (video files only, 0 to disable)
+    "PREFETCH_DEPTH" : 4,  # Number of decoded frames buffered ahead of detection (0 to decode on the processing thread)
+    "MOTION_GATE" : False,  # Skip detection on frames without motion, tracks are only predicted
+    "MOTION_WIDTH" : 160,  # Frame width used to look for motion
+    "MOTION_THRESH" : 0.002,  # Fraction of changed pixels needed to run detection
+    "MOTION_MAX_SKIP" : 5,  # Run detection at least once every this many processed frames
+    "ADAPTIVE_STRIDE" : False,  # Adjust the number of frames skipped to the processing cost (video files only)
+    "TARGET_FPS" : 0,  # Video frames per second the adaptive stride keeps up with (0 for the video FPS, i.e. real time)
+    "DETECT_BATCH" : 4,  # Frames detected together in one call (video files only)
+    "LAZY_FEATURES" : False,  # Only compute appearance features of detections not clearly matched by motion and overlap
+    "FEATURE_REFRESH" : 10,  # Clearly matched people still get a new appearance feature once every this many detections
+    "PIPELINE_ENCODER" : False  # Compute appearance features on a worker thread while the next frames are detected (video files only)
+}
+
+# Thread pools, applied at startup and set by autotune.py (0 for the library default)
+THREAD_CONFIG = {
+    "TORCH_THREADS" : 4,  # PyTorch intra-op threads (detector)
+    "TORCH_INTEROP_THREADS" : 0,  # PyTorch inter-op threads
+    "TF_THREADS" : 0,  # TensorFlow intra-op threads (encoder)
+    "CV2_THREADS" : 0  # OpenCV threads (resizing and patch extraction)
+}
+
+# Autotune benchmark (autotune.py)
+TUNE_CONFIG = {
+    "VIDEO" : "test.mp4",  # Video the benchmark frames are taken from
+    "FRAMES" : 64,  # Number of frames run for each setting
+    "IMG_SIZES" : [640, 512, 416, 320],  # Inference sizes to try
+    "BATCH_SIZES" : [1, 2, 4, 8],  # Detection batch sizes to try
+    "MIN_DETECTION_RATIO" : 0.95  # A smaller inference size must keep this fraction of the detections at the largest size
+}
+
+# Detections and features kept on disk, so reruns of a video file skip detection
+CACHE_CONFIG = {
+    "ENABLED" : False,
+    "DIR" : "cache"  # One folder per video, model and detection settings
+}
+
+# Inference size picked per group of frames from the tracked people, video files and cameras
+SIZE_POLICY_CONFIG = {
+    "ENABLED" : False,
+    "POLICY" : "density",  # "density", "fixed" or the import path of a size_policy.SizePolicy subclass
+    "SIZES" : [320, 416, 512, 640],  # Inference sizes to choose from, multiples of 32
+    "PARAMS" : {
+        "min_box_px" : 32,  # Smallest person height in pixels at the detector input
+        "dense_count" : 30,  # Tracked people from which the largest size is always used
+        "window" : 10,  # Detection calls between two size changes
+        "refresh" : 5  # Every refresh-th window uses the largest size to find new small people, 0 to disable
+    }
+}
+
+# Tiled detection for high resolution frames, allows FRAME_SIZE above 1920
+TILE_CONFIG = {
+    "ENABLED" : False,
+    "TILE_SIZE" : 640,  # Tile width and height in pixels
+    "OVERLAP" : 0.2,  # Overlap between neighbouring tiles, as a fraction of the tile size
+    "NMS_THRESH" : 0.6  # Overlap above which a box found in two tiles is removed
+}
+
+# Multi camera processing (multi_stream.py), all streams share one detector and encoder
+MULTI_STREAM_CONFIG = {
+    "STREAMS" : [
+        {"NAME": "cam1", "VIDEO_CAP": "test.mp4", "IS_CAM": False},
+        {"NAME": "cam2", "VIDEO_CAP": 0, "IS_CAM": True, "ROI": []}
+    ],
+    "BATCH_SIZE" : 16  # Max frames from different streams per detector call
+}
+
+# Parallel processing of one video file (chunk_process.py)
+CHUNK_CONFIG = {
+    "WORKERS" : 0,  # Number of worker processes (0 to use every CPU core)
+    "CHUNK_SEC" : 300,  # Length of each chunk of video in seconds
+    "OVERLAP_SEC" : 5  # Video processed before each chunk to warm up the tracker and stitch tracks
 }
 
 # Show individuals detected
@@ -2,6 +2,14 @@
 import numpy as np
 
 
+# Record layout of the detector output: one row per detection with the
+# bounding box `(x, y, w, h)`, the confidence score and the centroid.
+DETECTION_DTYPE = np.dtype([
+    ("tlwh", np.float64, (4,)),
+    ("confidence", np.float64),
+    ("centroid", np.int64, (2,))])
+
+
 class Detection(object):
     """
     This class represents a bounding box detection in a single image.
@@ -50,3 +58,84 @@ class Detection(object):
         ret[:2] += ret[2:] / 2
         ret[2] /= ret[3]
         return ret
+
+
+class DetectionBatch(object):
+    """
+    This class represents all bounding box detections in a single image,
+    stored as arrays instead of one `Detection` object per box.
+
+    Parameters
+    ----------
+    tlwh : array_like
+        An Nx4 matrix of bounding boxes in format `(x, y, w, h)`.
+    confidence : array_like
+        Detector confidence score of each box.
+    centroid : array_like
+        An Nx2 matrix of box centroids.
+    feature : Optional[array_like]
+        An NxM matrix of feature vectors, one per box.
+
+    Attributes
+    ----------
+    tlwh : ndarray
+        Bounding boxes in format `(top left x, top left y, width, height)`.
+    confidence : ndarray
+        Detector confidence scores.
+    centroid : ndarray
+        Box centroids.
+    feature : ndarray | NoneType
+        Feature vectors that describe the objects contained in this image.
+    xyah : ndarray
+        Bounding boxes in format `(center x, center y, aspect ratio, height)`.
+
+    """
+
+    def __init__(self, tlwh, confidence, centroid, feature=None):
+        self.tlwh = np.asarray(tlwh, dtype=np.float64).reshape(-1, 4)
+        self.confidence = np.asarray(confidence, dtype=np.float64).reshape(-1)
+        self.centroid = np.asarray(centroid).reshape(-1, 2)
+        self.feature = None if feature is None else np.asarray(
+            feature, dtype=np.float32)
+        self.xyah = self.to_xyah()
+
+    @classmethod
+    def from_array(cls, detections, feature=None):
+        """Create a batch from detector output with `DETECTION_DTYPE` rows."""
+        return cls(detections["tlwh"], detections["confidence"],
+                   detections["centroid"], feature)
+
+    @classmethod
+    def from_detections(cls, detections):
+        """Create a batch from a list of `Detection` objects."""
+        if len(detections) == 0:
+            return cls(np.zeros((0, 4)), np.zeros(0), np.zeros((0, 2), int))
+        return cls([d.tlwh for d in detections],
+                   [d.confidence for d in detections],
+                   [d.centroid for d in detections],
+                   [d.feature for d in detections])
+
+    def __len__(self):
+        return len(self.tlwh)
+
+    def __getitem__(self, index):
+        """Get a single `Detection`, for code that works on one box."""
+        feature = None if self.feature is None else self.feature[index]
+        return Detection(self.tlwh[index], self.confidence[index],
+                         self.centroid[index], feature)
+
+    def to_tlbr(self):
+        """Convert all bounding boxes to format `(min x, min y, max x, max y)`.
+        """
+        ret = self.tlwh.copy()
+        ret[:, 2:] += ret[:, :2]
+        return ret
+
+    def to_xyah(self):
+        """Convert all bounding boxes to format `(center x, center y, aspect
+        ratio, height)`, where the aspect ratio is `width / height`.
+        """
+        ret = self.tlwh.copy()
+        ret[:, :2] += ret[:, 2:] / 2
+        ret[:, 2] /= ret[:, 3]
+        return ret
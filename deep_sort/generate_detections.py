@@ -2,15 +2,30 @@
 import os
 import errno
 import argparse
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import numpy as np
 import cv2
 import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
-import tensorflow.compat.v1 as tf
-    
-physical_devices = tf.config.experimental.list_physical_devices('GPU')
-if len(physical_devices) > 0:
-    tf.config.experimental.set_memory_growth(physical_devices[0], True)
+
+_tf = None
+
+
+def import_tensorflow():
+    """Import TensorFlow on first use, so that importing this module and
+    running ONNX encoders does not load it.
+    """
+    global _tf
+    if _tf is None:
+        import tensorflow.compat.v1 as tf
+        physical_devices = tf.config.experimental.list_physical_devices('GPU')
+        if len(physical_devices) > 0:
+            tf.config.experimental.set_memory_growth(physical_devices[0], True)
+        _tf = tf
+    return _tf
 
 def _run_in_batches(f, data_dict, out, batch_size):
     data_len = len(out)
@@ -73,10 +88,70 @@ def extract_image_patch(image, bbox, patch_shape):
     return image
 
 
+def extract_image_patches(image, boxes, patch_shape, out=None):
+    """Extract the image patches of several bounding boxes at once.
+
+    Gives the same patches as `extract_image_patch`, with the boxes adapted
+    and clipped all together and each patch resized straight into `out`.
+
+    Parameters
+    ----------
+    image : ndarray
+        The full image.
+    boxes : array_like
+        An Nx4 matrix of bounding boxes in format (x, y, width, height).
+    patch_shape : array_like
+        The patch shape (height, width).
+    out : Optional[ndarray]
+        A buffer of at least N patches of shape
+        `patch_shape + image.shape[2:]` and of the image dtype, that is
+        written into. If None, a new buffer is allocated.
+
+    Returns
+    -------
+    (ndarray, ndarray)
+        The first N patches of `out`, and a boolean array that is False for
+        the boxes that are empty or fully outside of the image. The patches
+        of those boxes are set to zero.
+
+    """
+    boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+    if out is None:
+        out = np.empty((len(boxes),) + tuple(patch_shape) + image.shape[2:], image.dtype)
+    patches = out[:len(boxes)]
+
+    # correct aspect ratio to patch shape
+    target_aspect = float(patch_shape[1]) / patch_shape[0]
+    new_width = target_aspect * boxes[:, 3]
+    boxes[:, 0] -= (new_width - boxes[:, 2]) / 2
+    boxes[:, 2] = new_width
+
+    # convert to top left, bottom right
+    boxes[:, 2:] += boxes[:, :2]
+    boxes = boxes.astype(int)
+
+    # clip at image boundaries
+    boxes[:, :2] = np.maximum(0, boxes[:, :2])
+    boxes[:, 2:] = np.minimum(np.asarray(image.shape[:2][::-1]) - 1, boxes[:, 2:])
+    valid = np.all(boxes[:, :2] < boxes[:, 2:], axis=1)
+
+    size = (int(patch_shape[1]), int(patch_shape[0]))
+    for i in np.flatnonzero(valid):
+        sx, sy, ex, ey = boxes[i]
+        cv2.resize(image[sy:ey, sx:ex], size, dst=patches[i])
+    patches[~valid] = 0
+    return patches, valid
+
+
 class ImageEncoder(object):
 
-    def __init__(self, checkpoint_filename, input_name="images", output_name="features"):
-        self.session = tf.Session()
+    def __init__(self, checkpoint_filename, input_name="images", output_name="features",
+                 threads=0):
+        tf = import_tensorflow()
+        config = None
+        if threads > 0:
+            config = tf.ConfigProto(intra_op_parallelism_threads=threads)
+        self.session = tf.Session(config=config)
         with tf.gfile.GFile(checkpoint_filename, "rb") as file_handle:
             graph_def = tf.GraphDef()
             graph_def.ParseFromString(file_handle.read())
@@ -102,33 +177,396 @@ class ImageEncoder(object):
         return out
 
 
-def create_box_encoder(model_filename, input_name="images:0", output_name="features:0", batch_size=32):
-    image_encoder = ImageEncoder(model_filename, input_name, output_name)
+def convert_to_onnx(checkpoint_filename, onnx_filename=None, input_name="images:0",
+                    output_name="features:0", atol=1e-4):
+    """Convert a frozen TensorFlow encoder graph to ONNX.
+
+    This needs TensorFlow and tf2onnx and only runs once; the ONNX model is
+    then run by `OnnxImageEncoder` or `OpenCVImageEncoder` without
+    TensorFlow.
+
+    Parameters
+    ----------
+    checkpoint_filename : str
+        Path of the frozen inference graph protobuf.
+    onnx_filename : Optional[str]
+        Path of the ONNX model. If None, `checkpoint_filename` with the
+        `.onnx` extension.
+    input_name : str
+        Name of the input tensor of the graph.
+    output_name : str
+        Name of the output tensor of the graph.
+    atol : float
+        Largest absolute difference allowed between the features of both
+        models on random patches. The ONNX model is removed if it is
+        exceeded.
+
+    Returns
+    -------
+    str
+        Path of the ONNX model.
+
+    """
+    if onnx_filename is None:
+        onnx_filename = os.path.splitext(checkpoint_filename)[0] + ".onnx"
+    if os.path.exists(onnx_filename):
+        return onnx_filename
+
+    import tf2onnx
+    tf = import_tensorflow()
+    print("Converting %s to ONNX, this is only done once..." % checkpoint_filename)
+    with tf.gfile.GFile(checkpoint_filename, "rb") as file_handle:
+        graph_def = tf.GraphDef()
+        graph_def.ParseFromString(file_handle.read())
+    tf2onnx.convert.from_graph_def(graph_def, input_names=[input_name],
+                                   output_names=[output_name], output_path=onnx_filename)
+
+    # Both models must give the same features
+    try:
+        error = compare_to_tensorflow(checkpoint_filename, OnnxImageEncoder(onnx_filename),
+                                      input_name, output_name, atol)
+    except ValueError:
+        os.remove(onnx_filename)
+        raise
+    print("Wrote %s (largest feature difference %g)" % (onnx_filename, error))
+    return onnx_filename
+
+
+def compare_to_tensorflow(checkpoint_filename, image_encoder, input_name="images:0",
+                          output_name="features:0", atol=1e-4):
+    """Check that an encoder gives the features of the TensorFlow graph it
+    was converted from, on random patches.
+
+    Parameters
+    ----------
+    checkpoint_filename : str
+        Path of the frozen inference graph protobuf.
+    image_encoder : OnnxImageEncoder | OpenCVImageEncoder
+        The converted encoder.
+    input_name : str
+        Name of the input tensor of the graph.
+    output_name : str
+        Name of the output tensor of the graph.
+    atol : float
+        Largest absolute difference allowed between the features.
+
+    Returns
+    -------
+    float
+        The largest absolute difference between the features.
+
+    Raises
+    ------
+    ValueError
+        If the difference is more than `atol`.
+
+    """
+    tf = import_tensorflow()
+    patches = np.random.RandomState(0).uniform(
+        0., 255., [32] + list(image_encoder.image_shape)).astype(np.uint8)
+    # A graph of its own, the encoder graph may already be imported
+    with tf.Graph().as_default():
+        tf_encoder = ImageEncoder(checkpoint_filename, input_name, output_name)
+        expected = tf_encoder(patches)
+    tf_encoder.session.close()
+    error = np.abs(expected - image_encoder(patches)).max()
+    if not error <= atol:
+        raise ValueError("%s features differ from TensorFlow by %g"
+                         % (type(image_encoder).__name__, error))
+    return error
+
+
+class OnnxImageEncoder(object):
+    """Run an encoder network converted to ONNX (for example the INT8 model
+    written by `quantize.py`) with ONNX Runtime. Same interface as
+    `ImageEncoder`.
+    """
+
+    def __init__(self, onnx_filename, threads=0):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            onnx_filename, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        output = self.session.get_outputs()[0]
+        self.output_name = output.name
+        self.feature_dim = output.shape[-1]
+        self.image_shape = list(self.session.get_inputs()[0].shape[1:])
+
+    def __call__(self, data_x, batch_size=32):
+        out = np.zeros((len(data_x), self.feature_dim), np.float32)
+        _run_in_batches(
+            lambda x: self.session.run([self.output_name], x)[0],
+            {self.input_name: data_x}, out, batch_size)
+        return out
+
+
+class OpenCVImageEncoder(object):
+    """Run an encoder network converted to ONNX with the OpenCV DNN module,
+    so no other inference package is needed. Its thread count is the one
+    of OpenCV. Same interface as `ImageEncoder`.
+    """
+
+    def __init__(self, onnx_filename, image_shape=(128, 64, 3)):
+        self.image_shape = list(image_shape)
+        try:
+            self.net = cv2.dnn.readNetFromONNX(onnx_filename)
+            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            self.feature_dim = self._run(np.zeros([1] + self.image_shape, np.uint8)).shape[-1]
+        except cv2.error as e:
+            # e.g. the Loop node the preprocessing map_fn of the mars
+            # graphs is converted to
+            raise ValueError("OpenCV DNN cannot run %s, use the onnxruntime "
+                             "backend: %s" % (onnx_filename, e))
+
+    def _run(self, data_x):
+        self.net.setInput(np.ascontiguousarray(data_x, dtype=np.float32))
+        return self.net.forward()
+
+    def __call__(self, data_x, batch_size=32):
+        out = np.zeros((len(data_x), self.feature_dim), np.float32)
+        _run_in_batches(
+            lambda x: self._run(x["images"]), {"images": data_x}, out, batch_size)
+        return out
+
+
+ENCODER_BACKENDS = ("tensorflow", "onnxruntime", "opencv")
+
+
+def create_image_encoder(model_filename, input_name="images:0", output_name="features:0",
+                         threads=0, backend=None):
+    """Load the encoder network that returns the features of image patches.
+
+    `backend` is one of `ENCODER_BACKENDS`. A TensorFlow graph given to the
+    `onnxruntime` or `opencv` backend is converted to ONNX the first time
+    (see `convert_to_onnx`), and the first time it is run by `opencv` its
+    features are also checked against TensorFlow. ONNX models use
+    `onnxruntime` unless `opencv` is asked for.
+    """
+    if backend not in ENCODER_BACKENDS + (None,):
+        raise ValueError("Unknown encoder backend: %s" % backend)
+    checkpoint_filename = None
+    if model_filename.endswith(".onnx"):
+        if backend in (None, "tensorflow"):
+            backend = "onnxruntime"
+    elif backend in ("onnxruntime", "opencv"):
+        checkpoint_filename = model_filename
+        model_filename = convert_to_onnx(model_filename, input_name=input_name, output_name=output_name)
+
+    if backend == "onnxruntime":
+        image_encoder = OnnxImageEncoder(model_filename, threads)
+    elif backend == "opencv":
+        image_encoder = OpenCVImageEncoder(model_filename)
+        # Marks the ONNX model as checked, written again if it is converted again
+        checked_filename = os.path.splitext(model_filename)[0] + ".opencv_checked"
+        if checkpoint_filename is not None and not (
+                os.path.exists(checked_filename)
+                and os.path.getmtime(checked_filename) >= os.path.getmtime(model_filename)):
+            error = compare_to_tensorflow(checkpoint_filename, image_encoder, input_name, output_name)
+            with open(checked_filename, "w") as f:
+                f.write("%g\n" % error)
+            print("Checked %s with OpenCV DNN (largest feature difference %g)" % (model_filename, error))
+    else:
+        image_encoder = ImageEncoder(model_filename, input_name, output_name, threads)
+    return image_encoder
+
+
+def create_box_encoder(model_filename, input_name="images:0", output_name="features:0", batch_size=None,
+                       threads=0, backend=None):
+    """Create a function that returns the features of boxes in an image.
+
+    All boxes of an image are cut into one reused patch buffer and encoded
+    in batches of `batch_size`, or in a single run if None. Boxes without a
+    valid image patch get a row of NaN instead of a feature. See
+    `create_image_encoder` for `backend`.
+    """
+    image_encoder = create_image_encoder(model_filename, input_name, output_name, threads, backend)
     image_shape = image_encoder.image_shape
+    # Patch buffer of each thread, grown when a frame has more boxes
+    buffers = threading.local()
 
     def encoder(image, boxes):
-        image_patches = []
-        for box in boxes:
-            patch = extract_image_patch(image, box, image_shape[:2])
-            if patch is None:
-                print("WARNING: Failed to extract image patch: %s." % str(box))
-                patch = np.random.uniform(0., 255., image_shape).astype(np.uint8)
-            image_patches.append(patch)
-        image_patches = np.asarray(image_patches)
-        return image_encoder(image_patches, batch_size)
+        boxes = np.asarray(boxes).reshape(-1, 4)
+        features = np.full((len(boxes), image_encoder.feature_dim), np.nan, np.float32)
+        if len(boxes) == 0:
+            return features
+        out = getattr(buffers, "patches", None)
+        if out is None or len(out) < len(boxes) or out.dtype != image.dtype:
+            size = max(len(boxes), 2 * len(out) if out is not None else 32)
+            out = np.empty([size] + list(image_shape), image.dtype)
+            buffers.patches = out
+        (patches, valid) = extract_image_patches(image, boxes, image_shape[:2], out)
+        features[:] = image_encoder(patches, batch_size or len(patches))
+        features[~valid] = np.nan
+        return features
 
     return encoder
 
 
-def generate_detections(encoder, mot_dir, output_dir, detection_dir=None):
+def read_images(filenames, prefetch=16, threads=None):
+    """Read images in order, up to `prefetch` ahead of the caller, on a pool
+    of `threads` threads, or one thread per image read ahead if None.
+    """
+    prefetch = max(1, prefetch)
+    threads = prefetch if threads is None else min(prefetch, max(1, threads))
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = deque(
+            pool.submit(cv2.imread, filename, cv2.IMREAD_COLOR)
+            for filename in filenames[:prefetch])
+        for i in range(len(filenames)):
+            image = pending.popleft().result()
+            if i + prefetch < len(filenames):
+                pending.append(pool.submit(
+                    cv2.imread, filenames[i + prefetch], cv2.IMREAD_COLOR))
+            yield image
+
+
+def _load_sequence(sequence_dir, detection_file):
+    # Detection rows in frame order, with the start and end row and the
+    # image of each frame
+    image_dir = os.path.join(sequence_dir, "img1")
+    image_filenames = {
+        int(os.path.splitext(f)[0]): os.path.join(image_dir, f)
+        for f in os.listdir(image_dir)}
+
+    detections_in = np.loadtxt(detection_file, delimiter=',', ndmin=2)
+    frame_indices = detections_in[:, 0].astype(int)
+    found = np.isin(frame_indices, list(image_filenames))
+    for frame_idx in np.unique(frame_indices[~found]):
+        print("WARNING could not find image for frame %d" % frame_idx)
+
+    order = np.flatnonzero(found)
+    order = order[np.argsort(frame_indices[order], kind="stable")]
+    rows = detections_in[order]
+    frames, starts = np.unique(frame_indices[order], return_index=True)
+    ends = np.r_[starts[1:], len(rows)]
+    return rows, starts, ends, [image_filenames[f] for f in frames]
+
+
+def generate_sequence(image_encoder, sequence_dir, detection_file, output_filename,
+                      batch_size=1024, prefetch=16, threads=None):
+    """Generate detections with features for a single sequence.
+
+    Images are read ahead on a thread pool, the patches of consecutive
+    frames are encoded together, and the rows are written straight into a
+    memory-mapped `.npy` file, so memory use does not grow with the length
+    of the sequence.
+
+    Parameters
+    ----------
+    image_encoder : ImageEncoder | OnnxImageEncoder | OpenCVImageEncoder
+        The encoder network, see `create_image_encoder`.
+    sequence_dir : str
+        Path to the MOTChallenge sequence directory.
+    detection_file : str
+        Path to the detections in MOTChallenge format.
+    output_filename : str
+        Path of the output `.npy` file. Each row holds a row of
+        `detection_file` followed by its feature vector, NaN if no image
+        patch could be extracted.
+    batch_size : int
+        Number of patches encoded together.
+    prefetch : int
+        Number of images read ahead.
+    threads : Optional[int]
+        Number of threads reading images, at most `prefetch`. If None, one
+        per image read ahead.
+
+    Returns
+    -------
+    int
+        The number of rows written.
+
+    """
+    (rows, starts, ends, filenames) = _load_sequence(sequence_dir, detection_file)
+
+    image_shape = list(image_encoder.image_shape)
+    num_columns = rows.shape[1] + image_encoder.feature_dim
+    if len(rows) == 0:
+        np.save(output_filename, np.zeros((0, num_columns)), allow_pickle=False)
+        return 0
+    out = np.lib.format.open_memmap(
+        output_filename, mode="w+", dtype=np.float64, shape=(len(rows), num_columns))
+
+    patches = np.empty([batch_size] + image_shape, np.uint8)
+    valid = np.zeros(batch_size, bool)
+    written, count = 0, 0
+
+    def flush(out, start, count):
+        features = image_encoder(patches[:count], batch_size)
+        features[~valid[:count]] = np.nan
+        out[start:start + count, :rows.shape[1]] = rows[start:start + count]
+        out[start:start + count, rows.shape[1]:] = features
+
+    images = read_images(filenames, prefetch, threads)
+    for (s, e), bgr_image in zip(zip(starts, ends), images):
+        if count + e - s > len(patches):
+            if count > 0:
+                flush(out, written, count)
+                written, count = written + count, 0
+            if e - s > len(patches):
+                patches = np.empty([e - s] + image_shape, np.uint8)
+                valid = np.zeros(e - s, bool)
+        _, valid[count:count + e - s] = extract_image_patches(
+            bgr_image, rows[s:e, 2:6], image_shape[:2], patches[count:])
+        count += e - s
+    if count > 0:
+        flush(out, written, count)
+    out.flush()
+    del out
+    return len(rows)
+
+
+def _generate_sequence_boxes(encoder, sequence_dir, detection_file, output_filename,
+                             prefetch=16):
+    # One call of a box encoder per frame, see `create_box_encoder`
+    (rows, starts, ends, filenames) = _load_sequence(sequence_dir, detection_file)
+    detections_out = []
+    images = read_images(filenames, prefetch)
+    for (s, e), bgr_image in zip(zip(starts, ends), images):
+        features = encoder(bgr_image, rows[s:e, 2:6].copy())
+        detections_out += [np.r_[(row, feature)] for row, feature
+                           in zip(rows[s:e], features)]
+    np.save(output_filename, np.asarray(detections_out), allow_pickle=False)
+    return len(rows)
+
+
+_worker_encoder = None
+_worker_threads = None
+
+
+def _init_worker(model_filename, backend, threads):
+    # Each worker process loads its own encoder
+    global _worker_encoder, _worker_threads
+    _worker_encoder = create_image_encoder(
+        model_filename, threads=threads, backend=backend)
+    _worker_threads = threads
+
+
+def _generate_sequence_task(task):
+    (sequence, sequence_dir, detection_file, output_filename, batch_size, prefetch) = task
+    count = generate_sequence(
+        _worker_encoder, sequence_dir, detection_file, output_filename,
+        batch_size, prefetch, _worker_threads)
+    return sequence, count
+
+
+def generate_detections(encoder, mot_dir, output_dir, detection_dir=None,
+                        workers=None, backend=None, batch_size=1024, prefetch=16):
     """Generate detections with features.
 
     Parameters
     ----------
-    encoder : Callable[image, ndarray] -> ndarray
-        The encoder function takes as input a BGR color image and a matrix of
-        bounding boxes in format `(x, y, w, h)` and returns a matrix of
-        corresponding feature vectors.
+    encoder : str | Callable[image, ndarray] -> ndarray
+        Path to the encoder model, see `create_image_encoder`. Sequences are
+        then processed in parallel, one per worker process, each with its
+        own encoder and an equal share of the CPU cores.
+        Or an encoder function, see `create_box_encoder`, that takes as input
+        a BGR color image and a matrix of bounding boxes in format
+        `(x, y, w, h)` and returns a matrix of corresponding feature vectors.
+        Sequences are then processed one after the other in this process.
     mot_dir : str
         Path to the MOTChallenge directory (can be either train or test).
     output_dir
@@ -137,6 +575,15 @@ def generate_detections(encoder, mot_dir, output_dir, detection_dir=None):
         Path to custom detections. The directory structure should be the default
         MOTChallenge structure: `[sequence]/det/det.txt`. If None, uses the
         standard MOTChallenge detections.
+    workers : Optional[int]
+        Number of worker processes. If None, one per CPU core, at most one
+        per sequence.
+    backend : Optional[str]
+        The encoder backend, one of `ENCODER_BACKENDS`.
+    batch_size : int
+        Number of patches encoded together.
+    prefetch : int
+        Number of images read ahead in each sequence.
 
     """
     if detection_dir is None:
@@ -150,40 +597,29 @@ def generate_detections(encoder, mot_dir, output_dir, detection_dir=None):
             raise ValueError(
                 "Failed to created output directory '%s'" % output_dir)
 
-    for sequence in os.listdir(mot_dir):
-        print("Processing %s" % sequence)
-        sequence_dir = os.path.join(mot_dir, sequence)
-
-        image_dir = os.path.join(sequence_dir, "img1")
-        image_filenames = {
-            int(os.path.splitext(f)[0]): os.path.join(image_dir, f)
-            for f in os.listdir(image_dir)}
-
-        detection_file = os.path.join(
-            detection_dir, sequence, "det/det.txt")
-        detections_in = np.loadtxt(detection_file, delimiter=',')
-        detections_out = []
-
-        frame_indices = detections_in[:, 0].astype(int)
-        min_frame_idx = frame_indices.astype(int).min()
-        max_frame_idx = frame_indices.astype(int).max()
-        for frame_idx in range(min_frame_idx, max_frame_idx + 1):
-            print("Frame %05d/%05d" % (frame_idx, max_frame_idx))
-            mask = frame_indices == frame_idx
-            rows = detections_in[mask]
-
-            if frame_idx not in image_filenames:
-                print("WARNING could not find image for frame %d" % frame_idx)
-                continue
-            bgr_image = cv2.imread(
-                image_filenames[frame_idx], cv2.IMREAD_COLOR)
-            features = encoder(bgr_image, rows[:, 2:6].copy())
-            detections_out += [np.r_[(row, feature)] for row, feature
-                               in zip(rows, features)]
-
-        output_filename = os.path.join(output_dir, "%s.npy" % sequence)
-        np.save(
-            output_filename, np.asarray(detections_out), allow_pickle=False)
+    tasks = [(sequence, os.path.join(mot_dir, sequence),
+              os.path.join(detection_dir, sequence, "det/det.txt"),
+              os.path.join(output_dir, "%s.npy" % sequence), batch_size, prefetch)
+             for sequence in sorted(os.listdir(mot_dir))]
+    if callable(encoder):
+        # workers, backend and batch_size only apply to an encoder model
+        for (sequence, sequence_dir, detection_file, output_filename, _, _) in tasks:
+            count = _generate_sequence_boxes(
+                encoder, sequence_dir, detection_file, output_filename, prefetch)
+            print("Processed %s: %d detections" % (sequence, count))
+        return
+
+    if workers is None:
+        workers = min(os.cpu_count() or 1, len(tasks))
+    workers = max(1, workers)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    # Fresh processes, TensorFlow does not survive a fork
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(encoder, backend, threads)) as pool:
+        for sequence, count in pool.map(_generate_sequence_task, tasks):
+            print("Processed %s: %d detections" % (sequence, count))
 
 
 def parse_args():
@@ -194,6 +630,10 @@ def parse_args():
         "--model",
         default="resources/networks/mars-small128.pb",
         help="Path to freezed inference graph protobuf.")
+    parser.add_argument(
+        "--backend", default="tensorflow", choices=ENCODER_BACKENDS,
+        help="Runtime of the encoder. Other than tensorflow, the graph is "
+        "converted to ONNX on first use.")
     parser.add_argument(
         "--mot_dir", help="Path to MOTChallenge directory (train or test)",
         required=True)
@@ -204,14 +644,23 @@ def parse_args():
     parser.add_argument(
         "--output_dir", help="Output directory. Will be created if it does not"
         " exist.", default="detections")
+    parser.add_argument(
+        "--workers", help="Number of worker processes. Defaults to one per "
+        "CPU core, at most one per sequence.", default=None, type=int)
+    parser.add_argument(
+        "--batch_size", help="Number of image patches encoded together.",
+        default=1024, type=int)
+    parser.add_argument(
+        "--prefetch", help="Number of images read ahead in each sequence.",
+        default=16, type=int)
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
-    encoder = create_box_encoder(args.model, batch_size=32)
-    generate_detections(encoder, args.mot_dir, args.output_dir,
-                        args.detection_dir)
+    generate_detections(args.model, args.mot_dir, args.output_dir,
+                        args.detection_dir, args.workers, args.backend,
+                        args.batch_size, args.prefetch)
 
 
 if __name__ == "__main__":
@@ -122,6 +122,46 @@ class KalmanFilter(object):
 
         return mean, covariance
 
+    def multi_predict(self, mean, covariance):
+        """Run Kalman filter prediction step for several states at once
+        (vectorized version of `predict`).
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional matrix of mean vectors of the object states at
+            the previous time step.
+        covariance : ndarray
+            The Nx8x8 dimensional array of covariance matrices of the object
+            states at the previous time step.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the mean vectors and covariance matrices of the predicted
+            states.
+
+        """
+        height = mean[:, 3]
+        std = np.stack([
+            self._std_weight_position * height,
+            self._std_weight_position * height,
+            np.full_like(height, 1e-2),
+            self._std_weight_position * height,
+            self._std_weight_velocity * height,
+            self._std_weight_velocity * height,
+            np.full_like(height, 1e-5),
+            self._std_weight_velocity * height], axis=1)
+        motion_cov = np.zeros_like(covariance)
+        diagonal = np.arange(8)
+        motion_cov[:, diagonal, diagonal] = np.square(std)
+
+        mean = np.dot(mean, self._motion_mat.T)
+        covariance = np.matmul(np.matmul(
+            self._motion_mat, covariance), self._motion_mat.T) + motion_cov
+
+        return mean, covariance
+
     def project(self, mean, covariance):
         """Project state distribution to measurement space.
 
@@ -151,6 +191,39 @@ class KalmanFilter(object):
             self._update_mat, covariance, self._update_mat.T))
         return mean, covariance + innovation_cov
 
+    def multi_project(self, mean, covariance):
+        """Project several state distributions to measurement space
+        (vectorized version of `project`).
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional matrix of mean vectors.
+        covariance : ndarray
+            The Nx8x8 dimensional array of covariance matrices.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the Nx4 projected means and Nx4x4 covariance matrices of
+            the given state estimates.
+
+        """
+        height = mean[:, 3]
+        std = np.stack([
+            self._std_weight_position * height,
+            self._std_weight_position * height,
+            np.full_like(height, 1e-1),
+            self._std_weight_position * height], axis=1)
+        innovation_cov = np.zeros((len(mean), 4, 4))
+        diagonal = np.arange(4)
+        innovation_cov[:, diagonal, diagonal] = np.square(std)
+
+        mean = np.dot(mean, self._update_mat.T)
+        covariance = np.matmul(np.matmul(
+            self._update_mat, covariance), self._update_mat.T)
+        return mean, covariance + innovation_cov
+
     def update(self, mean, covariance, measurement):
         """Run Kalman filter correction step.
 
@@ -185,6 +258,41 @@ class KalmanFilter(object):
             kalman_gain, projected_cov, kalman_gain.T))
         return new_mean, new_covariance
 
+    def multi_update(self, mean, covariance, measurements):
+        """Run Kalman filter correction step for several states at once
+        (vectorized version of `update`).
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional matrix of predicted mean vectors.
+        covariance : ndarray
+            The Nx8x8 dimensional array of covariance matrices.
+        measurements : ndarray
+            The Nx4 dimensional matrix of measurements (x, y, a, h), one for
+            each state.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the measurement-corrected state distributions.
+
+        """
+        projected_mean, projected_cov = self.multi_project(mean, covariance)
+
+        # Solve all innovation systems at once instead of one Cholesky
+        # factorization per state
+        kalman_gain = np.linalg.solve(
+            projected_cov,
+            np.matmul(covariance, self._update_mat.T).transpose(0, 2, 1)
+        ).transpose(0, 2, 1)
+        innovation = measurements - projected_mean
+
+        new_mean = mean + np.matmul(kalman_gain, innovation[:, :, None])[:, :, 0]
+        new_covariance = covariance - np.matmul(np.matmul(
+            kalman_gain, projected_cov), kalman_gain.transpose(0, 2, 1))
+        return new_mean, new_covariance
+
     def gating_distance(self, mean, covariance, measurements,
                         only_position=False):
         """Compute gating distance between state distribution and measurements.
@@ -227,3 +335,40 @@ class KalmanFilter(object):
             overwrite_b=True)
         squared_maha = np.sum(z * z, axis=0)
         return squared_maha
+
+    def multi_gating_distance(self, mean, covariance, measurements,
+                              only_position=False):
+        """Compute gating distances between several state distributions and
+        measurements at once (vectorized version of `gating_distance`).
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional matrix of mean vectors.
+        covariance : ndarray
+            The Nx8x8 dimensional array of covariance matrices.
+        measurements : ndarray
+            An Mx4 dimensional matrix of M measurements in format (x, y, a, h).
+        only_position : Optional[bool]
+            If True, distance computation is done with respect to the bounding
+            box center position only.
+
+        Returns
+        -------
+        ndarray
+            Returns an NxM matrix, where element (i, j) contains the squared
+            Mahalanobis distance between the i-th state distribution and
+            `measurements[j]`.
+
+        """
+        mean, covariance = self.multi_project(mean, covariance)
+        if only_position:
+            mean, covariance = mean[:, :2], covariance[:, :2, :2]
+            measurements = measurements[:, :2]
+
+        # Inverse Cholesky factors, so that all distances are one product
+        cholesky_factor = np.linalg.cholesky(covariance)
+        inverse_factor = np.linalg.inv(cholesky_factor)
+        d = measurements[None, :, :] - mean[:, None, :]
+        z = np.matmul(d, inverse_factor.transpose(0, 2, 1))
+        return np.sum(z * z, axis=2)
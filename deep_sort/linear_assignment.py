@@ -15,7 +15,7 @@ def min_cost_matching(
 
     Parameters
     ----------
-    distance_metric : Callable[List[Track], List[Detection], List[int], List[int]) -> ndarray
+    distance_metric : Callable[List[Track], DetectionBatch, List[int], List[int]) -> ndarray
         The distance metric is given a list of tracks and detections as well as
         a list of N track indices and M detection indices. The metric should
         return the NxM dimensional cost matrix, where element (i, j) is the
@@ -26,8 +26,8 @@ def min_cost_matching(
         disregarded.
     tracks : List[track.Track]
         A list of predicted tracks at the current time step.
-    detections : List[detection.Detection]
-        A list of detections at the current time step.
+    detections : detection.DetectionBatch
+        The detections at the current time step.
     track_indices : List[int]
         List of track indices that maps rows in `cost_matrix` to tracks in
         `tracks` (see description above).
@@ -83,7 +83,7 @@ def matching_cascade(
 
     Parameters
     ----------
-    distance_metric : Callable[List[Track], List[Detection], List[int], List[int]) -> ndarray
+    distance_metric : Callable[List[Track], DetectionBatch, List[int], List[int]) -> ndarray
         The distance metric is given a list of tracks and detections as well as
         a list of N track indices and M detection indices. The metric should
         return the NxM dimensional cost matrix, where element (i, j) is the
@@ -96,8 +96,8 @@ def matching_cascade(
         The cascade depth, should be se to the maximum track age.
     tracks : List[track.Track]
         A list of predicted tracks at the current time step.
-    detections : List[detection.Detection]
-        A list of detections at the current time step.
+    detections : detection.DetectionBatch
+        The detections at the current time step.
     track_indices : Optional[List[int]]
         List of track indices that maps rows in `cost_matrix` to tracks in
         `tracks` (see description above). Defaults to all tracks.
@@ -144,7 +144,7 @@ def matching_cascade(
 
 def gate_cost_matrix(
         kf, cost_matrix, tracks, detections, track_indices, detection_indices,
-        gated_cost=INFTY_COST, only_position=False):
+        gated_cost=INFTY_COST, only_position=False, gating_distance=None):
     """Invalidate infeasible entries in cost matrix based on the state
     distributions obtained by Kalman filtering.
 
@@ -158,8 +158,8 @@ def gate_cost_matrix(
         `detections[detection_indices[j]]`.
     tracks : List[track.Track]
         A list of predicted tracks at the current time step.
-    detections : List[detection.Detection]
-        A list of detections at the current time step.
+    detections : detection.DetectionBatch
+        The detections at the current time step.
     track_indices : List[int]
         List of track indices that maps rows in `cost_matrix` to tracks in
         `tracks` (see description above).
@@ -172,6 +172,11 @@ def gate_cost_matrix(
     only_position : Optional[bool]
         If True, only the x, y position of the state distribution is considered
         during gating. Defaults to False.
+    gating_distance : Optional[ndarray]
+        The squared Mahalanobis distances between all tracks and all
+        detections, as returned by `gating_distance_matrix`, so that they are
+        computed once per time step and sliced here. If None, the distances
+        of the given tracks and detections are computed.
 
     Returns
     -------
@@ -181,11 +186,54 @@ def gate_cost_matrix(
     """
     gating_dim = 2 if only_position else 4
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
-    measurements = np.asarray(
-        [detections[i].to_xyah() for i in detection_indices])
-    for row, track_idx in enumerate(track_indices):
-        track = tracks[track_idx]
-        gating_distance = kf.gating_distance(
-            track.mean, track.covariance, measurements, only_position)
-        cost_matrix[row, gating_distance > gating_threshold] = gated_cost
+    if len(track_indices) == 0 or len(detection_indices) == 0:
+        return cost_matrix
+    if gating_distance is None:
+        gating_distance = gating_distance_matrix(
+            kf, tracks, detections, track_indices, detection_indices,
+            only_position)
+    else:
+        gating_distance = gating_distance[np.ix_(track_indices, detection_indices)]
+    cost_matrix[gating_distance > gating_threshold] = gated_cost
     return cost_matrix
+
+
+def gating_distance_matrix(
+        kf, tracks, detections, track_indices=None, detection_indices=None,
+        only_position=False):
+    """Compute the squared Mahalanobis distances between tracks and
+    detections, all in one vectorized operation.
+
+    Parameters
+    ----------
+    kf : The Kalman filter.
+    tracks : List[track.Track]
+        A list of predicted tracks at the current time step.
+    detections : detection.DetectionBatch
+        The detections at the current time step.
+    track_indices : Optional[List[int]]
+        List of track indices that maps rows of the result to tracks in
+        `tracks`. Defaults to all tracks.
+    detection_indices : Optional[List[int]]
+        List of detection indices that maps columns of the result to
+        detections in `detections`. Defaults to all detections.
+    only_position : Optional[bool]
+        If True, only the x, y position of the state distribution is
+        considered. Defaults to False.
+
+    Returns
+    -------
+    ndarray
+        Returns the NxM matrix of squared Mahalanobis distances.
+
+    """
+    if track_indices is None:
+        track_indices = np.arange(len(tracks))
+    if detection_indices is None:
+        detection_indices = np.arange(len(detections))
+    if len(track_indices) == 0 or len(detection_indices) == 0:
+        return np.zeros((len(track_indices), len(detection_indices)))
+    mean = np.array([tracks[i].mean for i in track_indices])
+    covariance = np.array([tracks[i].covariance for i in track_indices])
+    return kf.multi_gating_distance(
+        mean, covariance, detections.xyah[detection_indices], only_position)
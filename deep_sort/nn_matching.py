@@ -54,53 +54,16 @@ def _cosine_distance(a, b, data_is_normalized=False):
     return 1. - np.dot(a, b.T)
 
 
-def _nn_euclidean_distance(x, y):
-    """ Helper function for nearest neighbor distance metric (Euclidean).
-
-    Parameters
-    ----------
-    x : ndarray
-        A matrix of N row-vectors (sample points).
-    y : ndarray
-        A matrix of M row-vectors (query points).
-
-    Returns
-    -------
-    ndarray
-        A vector of length M that contains for each entry in `y` the
-        smallest Euclidean distance to a sample in `x`.
-
-    """
-    distances = _pdist(x, y)
-    return np.maximum(0.0, distances.min(axis=0))
-
-
-def _nn_cosine_distance(x, y):
-    """ Helper function for nearest neighbor distance metric (cosine).
-
-    Parameters
-    ----------
-    x : ndarray
-        A matrix of N row-vectors (sample points).
-    y : ndarray
-        A matrix of M row-vectors (query points).
-
-    Returns
-    -------
-    ndarray
-        A vector of length M that contains for each entry in `y` the
-        smallest cosine distance to a sample in `x`.
-
-    """
-    distances = _cosine_distance(x, y)
-    return distances.min(axis=0)
-
-
 class NearestNeighborDistanceMetric(object):
     """
     A nearest neighbor distance metric that, for each target, returns
     the closest distance to any sample that has been observed so far.
 
+    The samples of all targets are kept in one preallocated float32 gallery,
+    with a ring buffer of `budget` rows per target. Rows are normalized when
+    they are added for the cosine metric, so that `distance` is a single
+    matrix product followed by a minimum over the rows of each target.
+
     Parameters
     ----------
     metric : str
@@ -110,29 +73,63 @@ class NearestNeighborDistanceMetric(object):
         invalid match.
     budget : Optional[int]
         If not None, fix samples per class to at most this number. Removes
-        the oldest samples when the budget is reached.
+        the oldest samples when the budget is reached. If None, the gallery
+        grows without bound.
 
     Attributes
     ----------
-    samples : Dict[int -> List[ndarray]]
-        A dictionary that maps from target identities to the list of samples
-        that have been observed so far.
+    samples : Dict[int -> ndarray]
+        A dictionary that maps from target identities to the samples that
+        have been observed so far, oldest first (normalized for the cosine
+        metric).
 
     """
 
-    def __init__(self, metric, matching_threshold, budget=None):
-
-
-        if metric == "euclidean":
-            self._metric = _nn_euclidean_distance
-        elif metric == "cosine":
-            self._metric = _nn_cosine_distance
-        else:
+    def __init__(self, metric, matching_threshold, budget=100):
+        if metric not in ("euclidean", "cosine"):
             raise ValueError(
                 "Invalid metric; must be either 'euclidean' or 'cosine'")
+        self._normalize = metric == "cosine"
         self.matching_threshold = matching_threshold
         self.budget = budget
-        self.samples = {}
+
+        # Gallery of slots x rows per slot x feature dimension, allocated
+        # with the first samples
+        self._gallery = None
+        self._norms = None
+        self._valid = None
+        self._head = None
+        self._slots = {}
+        self._free = []
+
+    def _allocate(self, num_slots, num_rows, dim):
+        gallery = np.zeros((num_slots, num_rows, dim), np.float32)
+        norms = np.zeros((num_slots, num_rows), np.float32)
+        valid = np.zeros((num_slots, num_rows), bool)
+        head = np.zeros(num_slots, int)
+        old_slots = 0
+        if self._gallery is not None:
+            (old_slots, old_rows) = self._valid.shape
+            gallery[:old_slots, :old_rows] = self._gallery
+            norms[:old_slots, :old_rows] = self._norms
+            valid[:old_slots, :old_rows] = self._valid
+            head[:old_slots] = self._head
+            # Full rings of an unbounded gallery continue after their last row
+            if num_rows > old_rows:
+                head[:old_slots][self._valid.all(axis=1)] = old_rows
+        # New slots are handed out lowest first
+        self._free += list(range(num_slots - 1, old_slots - 1, -1))
+        (self._gallery, self._norms, self._valid, self._head) = (gallery, norms, valid, head)
+
+    def _slot(self, target):
+        slot = self._slots.get(target)
+        if slot is None:
+            if not self._free:
+                (num_slots, num_rows) = self._valid.shape
+                self._allocate(2 * num_slots, num_rows, self._gallery.shape[2])
+            slot = self._free.pop()
+            self._slots[target] = slot
+        return slot
 
     def partial_fit(self, features, targets, active_targets):
         """Update the distance metric with new data.
@@ -147,11 +144,46 @@ class NearestNeighborDistanceMetric(object):
             A list of targets that are currently present in the scene.
 
         """
-        for feature, target in zip(features, targets):
-            self.samples.setdefault(target, []).append(feature)
-            if self.budget is not None:
-                self.samples[target] = self.samples[target][-self.budget:]
-        self.samples = {k: self.samples[k] for k in active_targets}
+        active_targets = set(active_targets)
+        for target in [k for k in self._slots if k not in active_targets]:
+            slot = self._slots.pop(target)
+            self._valid[slot] = False
+            self._head[slot] = 0
+            self._free.append(slot)
+
+        features = np.asarray(features, dtype=np.float32)
+        if len(features) == 0:
+            return
+        if self._gallery is None:
+            self._allocate(32, self.budget or 16, features.shape[1])
+        norms = np.square(features).sum(axis=1)
+        if self._normalize:
+            features = features / np.sqrt(norms)[:, None]
+            norms = np.ones_like(norms)
+
+        for feature, norm, target in zip(features, norms, targets):
+            if target not in active_targets:
+                continue
+            slot = self._slot(target)
+            (num_slots, num_rows) = self._valid.shape
+            if self.budget is None and self._valid[slot].all():
+                # Unbounded gallery, no row is ever overwritten
+                self._allocate(num_slots, 2 * num_rows, self._gallery.shape[2])
+                num_rows *= 2
+            row = self._head[slot]
+            self._gallery[slot, row] = feature
+            self._norms[slot, row] = norm
+            self._valid[slot, row] = True
+            self._head[slot] = (row + 1) % num_rows
+
+    @property
+    def samples(self):
+        samples = {}
+        for target, slot in self._slots.items():
+            rows = np.roll(np.arange(self._valid.shape[1]), -self._head[slot])
+            rows = rows[self._valid[slot, rows]]
+            samples[target] = self._gallery[slot, rows]
+        return samples
 
     def distance(self, features, targets):
         """Compute distance between features and targets.
@@ -168,10 +200,33 @@ class NearestNeighborDistanceMetric(object):
         ndarray
             Returns a cost matrix of shape len(targets), len(features), where
             element (i, j) contains the closest squared distance between
-            `targets[i]` and `features[j]`.
+            `targets[i]` and `features[j]`. Targets without any sample are
+            at infinite distance.
 
         """
-        cost_matrix = np.zeros((len(targets), len(features)))
-        for i, target in enumerate(targets):
-            cost_matrix[i, :] = self._metric(self.samples[target], features)
-        return cost_matrix
+        features = np.asarray(features, dtype=np.float32)
+        if len(targets) == 0 or len(features) == 0:
+            return np.zeros((len(targets), len(features)))
+        if self._gallery is None:
+            return np.full((len(targets), len(features)), np.inf)
+        slots = np.array([self._slots.get(target, -1) for target in targets])
+        (num_slots, num_rows, dim) = self._gallery.shape
+
+        # One product against the whole gallery, then the nearest row of
+        # each target
+        if self._normalize:
+            features = features / np.linalg.norm(features, axis=1, keepdims=True)
+        products = np.dot(self._gallery.reshape(-1, dim), features.T)
+        products = products.reshape(num_slots, num_rows, len(features))
+        invalid = ~self._valid
+        if self._normalize:
+            products[invalid] = -np.inf
+            distances = 1. - products.max(axis=1)[slots].astype(np.float64)
+        else:
+            distances = self._norms[:, :, None] - 2. * products
+            distances[invalid] = np.inf
+            distances = distances.min(axis=1)[slots] + np.square(features).sum(axis=1)[None, :]
+            distances = np.maximum(0., distances).astype(np.float64)
+        # Tracks started from detections without a feature have no sample yet
+        distances[slots < 0] = np.inf
+        return distances
@@ -38,7 +38,7 @@ def non_max_suppression(boxes, classes, max_bbox_overlap, scores=None):
     if len(boxes) == 0:
         return []
 
-    boxes = boxes.astype(np.float64)
+    boxes = np.asarray(boxes).astype(np.float64)
     pick = []
 
     x1 = boxes[:, 0]
@@ -48,27 +48,25 @@ def non_max_suppression(boxes, classes, max_bbox_overlap, scores=None):
 
     area = (x2 - x1 + 1) * (y2 - y1 + 1)
     if scores is not None:
-        idxs = np.argsort(scores)
+        idxs = np.argsort(scores)[::-1]
     else:
-        idxs = np.argsort(y2)
-
-    while len(idxs) > 0:
-        last = len(idxs) - 1
-        i = idxs[last]
+        idxs = np.argsort(y2)[::-1]
+
+    # Overlap of every pair at once, relative to the area of the second box
+    xx1 = np.maximum(x1[:, None], x1[None, :])
+    yy1 = np.maximum(y1[:, None], y1[None, :])
+    xx2 = np.minimum(x2[:, None], x2[None, :])
+    yy2 = np.minimum(y2[:, None], y2[None, :])
+    w = np.maximum(0, xx2 - xx1 + 1)
+    h = np.maximum(0, yy2 - yy1 + 1)
+    suppress = (w * h) / area[None, :] > max_bbox_overlap
+
+    # Greedily keep the best remaining box and drop what it overlaps
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    for i in idxs:
+        if suppressed[i]:
+            continue
         pick.append(i)
-
-        xx1 = np.maximum(x1[i], x1[idxs[:last]])
-        yy1 = np.maximum(y1[i], y1[idxs[:last]])
-        xx2 = np.minimum(x2[i], x2[idxs[:last]])
-        yy2 = np.minimum(y2[i], y2[idxs[:last]])
-
-        w = np.maximum(0, xx2 - xx1 + 1)
-        h = np.maximum(0, yy2 - yy1 + 1)
-
-        overlap = (w * h) / area[idxs[:last]]
-
-        idxs = np.delete(
-            idxs, np.concatenate(
-                ([last], np.where(overlap > max_bbox_overlap)[0])))
+        suppressed |= suppress[i]
 
     return pick
@@ -55,12 +55,18 @@ class Track:
     age : int
         Total number of frames since first occurance.
     time_since_update : int
-        Total number of frames since last measurement update.
+        Total number of frames with a detection since last measurement update.
     state : TrackState
         The current track state.
     features : List[ndarray]
         A cache of features. On each measurement update, the associated feature
         vector is added to this list.
+    last_feature : Optional[ndarray]
+        Feature vector of the most recent associated detection. Unlike
+        `features`, this is kept after the tracker hands the cache over to the
+        distance metric.
+    feature_age : int
+        Number of measurement updates since the last one with a feature.
 
     """
 
@@ -77,12 +83,15 @@ class Track:
         self.features = []
         if feature is not None:
             self.features.append(feature)
+        self.last_feature = feature
+        self.feature_age = 0
 
         self._n_init = n_init
         self._max_age = max_age
 
-        # Movement trails, recorded by centroids
+        # Movement trails, recorded by centroids, and the time of each one
         self.positions = [position]
+        self.times = [entry]
 
         # Initial detection
         self.entry = entry
@@ -117,7 +126,7 @@ class Track:
         ret[2:] = ret[:2] + ret[2:]
         return ret
 
-    def predict(self, kf):
+    def predict(self, kf, state=None, missed=True):
         """Propagate the state distribution to the current time step using a
         Kalman filter prediction step.
 
@@ -125,13 +134,22 @@ class Track:
         ----------
         kf : kalman_filter.KalmanFilter
             The Kalman filter.
+        state : Optional[(ndarray, ndarray)]
+            The predicted mean and covariance, if already computed together
+            with other tracks by `kf.multi_predict`.
+        missed : bool
+            If False, no detection is run at this time step, and
+            `time_since_update` is left unchanged.
 
         """
-        self.mean, self.covariance = kf.predict(self.mean, self.covariance)
+        if state is None:
+            state = kf.predict(self.mean, self.covariance)
+        self.mean, self.covariance = state
         self.age += 1
-        self.time_since_update += 1
+        if missed:
+            self.time_since_update += 1
 
-    def update(self, kf, detection):
+    def update(self, kf, measurement, feature, centroid, state=None, time=None):
         """Perform Kalman filter measurement update step and update the feature
         cache.
 
@@ -139,14 +157,31 @@ class Track:
         ----------
         kf : kalman_filter.KalmanFilter
             The Kalman filter.
-        detection : Detection
-            The associated detection.
+        measurement : ndarray
+            Bounding box of the associated detection in format `(x, y, a, h)`.
+        feature : ndarray | NoneType
+            Feature vector of the associated detection. If None, the feature
+            cache is left unchanged.
+        centroid : ndarray
+            Centroid of the associated detection.
+        state : Optional[(ndarray, ndarray)]
+            The corrected mean and covariance, if already computed together
+            with other tracks by `kf.multi_update`.
+        time : Optional
+            Time of the measurement, kept in `times` beside the centroid.
 
         """
-        self.mean, self.covariance = kf.update(
-            self.mean, self.covariance, detection.to_xyah())
-        self.features.append(detection.feature)
-        self.positions.append(detection.centroid)
+        if state is None:
+            state = kf.update(self.mean, self.covariance, measurement)
+        self.mean, self.covariance = state
+        if feature is not None:
+            self.features.append(feature)
+            self.last_feature = feature
+            self.feature_age = 0
+        else:
+            self.feature_age += 1
+        self.positions.append(centroid)
+        self.times.append(time)
 
         self.hits += 1
         self.time_since_update = 0
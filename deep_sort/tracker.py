@@ -5,6 +5,7 @@ from . import kalman_filter
 from . import linear_assignment
 from . import iou_matching
 from .track import Track
+from .detection import DetectionBatch
 
 
 class Tracker:
@@ -21,6 +22,15 @@ class Tracker:
         Number of consecutive detections before the track is confirmed. The
         track state is set to `Deleted` if a miss occurs within the first
         `n_init` frames.
+    lazy_features : bool
+        If True, `update` takes detections without features and computes them
+        only for detections that are not clearly matched by motion and
+        overlap (see `update`).
+    clear_iou : float
+        Minimum overlap of a clear match in lazy feature mode.
+    feature_refresh : int
+        In lazy feature mode, a clearly matched track gets the feature of its
+        detection at least once every this many updates.
 
     Attributes
     ----------
@@ -34,46 +44,107 @@ class Tracker:
         A Kalman filter to filter target trajectories in image space.
     tracks : List[Track]
         The list of active tracks at the current time step.
+    encoded : int
+        Number of detections whose features were computed in lazy feature
+        mode.
+    skipped : int
+        Number of detections matched without features in lazy feature mode.
 
     """
 
-    def __init__(self, metric, max_iou_distance=0.7, max_age=30, n_init=3):
+    def __init__(self, metric, max_iou_distance=0.7, max_age=30, n_init=3,
+                 lazy_features=False, clear_iou=0.6, feature_refresh=10):
         self.metric = metric
         self.max_iou_distance = max_iou_distance
         self.max_age = max_age
         self.n_init = n_init
+        self.lazy_features = lazy_features
+        self.clear_iou = clear_iou
+        self.feature_refresh = feature_refresh
+        self.encoded = 0
+        self.skipped = 0
 
         self.kf = kalman_filter.KalmanFilter()
         self.tracks = []
         self._next_id = 1
 
-    def predict(self):
+    def set_max_age(self, max_age):
+        """Change the number of consecutive misses before a track is deleted,
+        for new tracks and for the tracks that are already alive.
+        """
+        self.max_age = max_age
+        for track in self.tracks:
+            track._max_age = max_age
+
+    def predict(self, missed=True):
         """Propagate track state distributions one time step forward.
 
         This function should be called once every time step, before `update`.
+        All tracks are predicted together on stacked arrays.
+
+        Parameters
+        ----------
+        missed : bool
+            If False, no detection is run at this time step (e.g. the frame is
+            skipped by a motion gate), so the step does not count as a miss
+            for `time_since_update`.
+
         """
-        for track in self.tracks:
-            track.predict(self.kf)
+        if len(self.tracks) == 0:
+            return
+        mean, covariance = self.kf.multi_predict(
+            np.array([t.mean for t in self.tracks]),
+            np.array([t.covariance for t in self.tracks]))
+        for i, track in enumerate(self.tracks):
+            track.predict(self.kf, (mean[i], covariance[i]), missed)
 
-    def update(self, detections, time):
+    def update(self, detections, time, encode=None):
         """Perform measurement update and track management.
 
         Parameters
         ----------
-        detections : List[deep_sort.detection.Detection]
-            A list of detections at the current time step.
+        detections : deep_sort.detection.DetectionBatch | List[deep_sort.detection.Detection]
+            The detections at the current time step. Detections with a NaN
+            feature, flagged by the encoder when no image patch could be
+            extracted, have no appearance: they are left out of the matching
+            cascade, but can still be matched by IOU or start a new track.
+        encode : Optional[Callable[ndarray] -> ndarray]
+            In lazy feature mode, when `detections` come without features,
+            returns the features of the detections at the given indices.
 
         """
+        if not isinstance(detections, DetectionBatch):
+            detections = DetectionBatch.from_detections(detections)
+
         # Run matching cascade.
-        matches, unmatched_tracks, unmatched_detections = self._match(detections)
+        matches, unmatched_tracks, unmatched_detections = self._match(detections, encode)
+        features = detections.feature
+        if features is None:
+            features = [None] * len(detections)
+        else:
+            # Detections without a feature, or not encoded in lazy feature
+            # mode, have NaN rows
+            features = [None if np.isnan(f).any() else f for f in features]
 
-        # Update track set.
-        for track_idx, detection_idx in matches:
-            self.tracks[track_idx].update(self.kf, detections[detection_idx])
+        # Update track set, all matched tracks together on stacked arrays.
+        if len(matches) > 0:
+            track_indices, detection_indices = map(list, zip(*matches))
+            mean, covariance = self.kf.multi_update(
+                np.array([self.tracks[i].mean for i in track_indices]),
+                np.array([self.tracks[i].covariance for i in track_indices]),
+                detections.xyah[detection_indices])
+        for i, (track_idx, detection_idx) in enumerate(matches):
+            self.tracks[track_idx].update(
+                self.kf, detections.xyah[detection_idx],
+                features[detection_idx], detections.centroid[detection_idx],
+                (mean[i], covariance[i]), time)
         for track_idx in unmatched_tracks:
             self.tracks[track_idx].mark_missed()
         for detection_idx in unmatched_detections:
-            self._initiate_track(detections[detection_idx], time)
+            self._initiate_track(
+                detections.xyah[detection_idx],
+                detections.centroid[detection_idx], features[detection_idx],
+                time)
         expired = []
         for t in self.tracks:
             if t.is_recorded():
@@ -95,15 +166,81 @@ class Tracker:
 
         return expired
 
-    def _match(self, detections):
+    def _match_clear(self, detections, encode, track_indices, gating_distance):
+        """Match confirmed tracks seen in the previous time step to a
+        detection when neither can be associated with anything else, then
+        compute the features of all other detections and of the matches
+        due for a feature refresh.
+
+        A pair is clear if it overlaps by at least `clear_iou`, the detection
+        is inside the gate of this confirmed track only and overlaps no
+        tentative track, and no other detection is inside the gate of the
+        track. The matching cascade and the IOU stage would associate such a
+        pair whatever its appearance.
+
+        `gating_distance` holds the squared Mahalanobis distances between
+        all tracks and detections. Returns the clear matches, the confirmed
+        tracks and the detections that are left. `detections.feature` is
+        set, with NaN rows for the detections that were not encoded.
+        """
+        detection_indices = np.arange(len(detections))
+        matches = []
+        if len(track_indices) > 0 and len(detections) > 0:
+            gated = linear_assignment.gate_cost_matrix(
+                self.kf, np.zeros((len(track_indices), len(detections))),
+                self.tracks, detections, track_indices, detection_indices,
+                gating_distance=gating_distance)
+            gated = gated < linear_assignment.INFTY_COST
+            overlap = 1. - iou_matching.iou_cost(
+                self.tracks, detections, track_indices, detection_indices)
+            claims = gated.sum(axis=0)
+            tentative = [i for i, t in enumerate(self.tracks) if not t.is_confirmed()]
+            if tentative:
+                claims += (iou_matching.iou_cost(
+                    self.tracks, detections, tentative, detection_indices) < 1.).sum(axis=0)
+            rows = np.flatnonzero(gated.sum(axis=1) == 1)
+            cols = gated[rows].argmax(axis=1)
+            for row, col in zip(rows, cols):
+                if claims[col] == 1 and overlap[row, col] >= self.clear_iou:
+                    matches.append((track_indices[row], col))
+
+        matched_tracks = set(k for k, _ in matches)
+        matched_detections = set(d for _, d in matches)
+        refresh = [d for k, d in matches
+                   if self.tracks[k].feature_age >= self.feature_refresh - 1]
+        remaining = [d for d in detection_indices if d not in matched_detections]
+        to_encode = np.array(sorted(remaining + refresh), dtype=int)
+        self.encoded += len(to_encode)
+        self.skipped += len(detections) - len(to_encode)
+
+        features = None
+        if len(to_encode) > 0:
+            encoded = np.asarray(encode(to_encode), dtype=np.float32)
+            features = np.full((len(detections), encoded.shape[1]), np.nan, np.float32)
+            features[to_encode] = encoded
+        elif len(detections) > 0:
+            features = np.full((len(detections), 1), np.nan, np.float32)
+        detections.feature = features
+
+        track_indices = [k for k in track_indices if k not in matched_tracks]
+        return matches, track_indices, remaining
+
+    def _match(self, detections, encode=None):
+
+        # Gating distances of all tracks and detections, computed once and
+        # sliced at every cascade level.
+        gating_distance = linear_assignment.gating_distance_matrix(
+            self.kf, self.tracks, detections)
 
         def gated_metric(tracks, dets, track_indices, detection_indices):
-            features = np.array([dets[i].feature for i in detection_indices])
+            features = dets.feature[detection_indices]
             targets = np.array([tracks[i].track_id for i in track_indices])
             cost_matrix = self.metric.distance(features, targets)
+            # No appearance match for detections without a feature
+            cost_matrix[:, np.isnan(features).any(axis=1)] = linear_assignment.INFTY_COST
             cost_matrix = linear_assignment.gate_cost_matrix(
                 self.kf, cost_matrix, tracks, dets, track_indices,
-                detection_indices)
+                detection_indices, gating_distance=gating_distance)
 
             return cost_matrix
 
@@ -113,11 +250,18 @@ class Tracker:
         unconfirmed_tracks = [
             i for i, t in enumerate(self.tracks) if not t.is_confirmed()]
 
+        # Match clear pairs without features, encode the rest.
+        matches_c = []
+        detection_indices = None
+        if self.lazy_features and encode is not None and detections.feature is None:
+            matches_c, confirmed_tracks, detection_indices = self._match_clear(
+                detections, encode, confirmed_tracks, gating_distance)
+
         # Associate confirmed tracks using appearance features.
         matches_a, unmatched_tracks_a, unmatched_detections = \
             linear_assignment.matching_cascade(
                 gated_metric, self.metric.matching_threshold, self.max_age,
-                self.tracks, detections, confirmed_tracks)
+                self.tracks, detections, confirmed_tracks, detection_indices)
 
         # Associate remaining tracks together with unconfirmed tracks using IOU.
         iou_track_candidates = unconfirmed_tracks + [
@@ -131,13 +275,13 @@ class Tracker:
                 iou_matching.iou_cost, self.max_iou_distance, self.tracks,
                 detections, iou_track_candidates, unmatched_detections)
 
-        matches = matches_a + matches_b
+        matches = matches_c + matches_a + matches_b
         unmatched_tracks = list(set(unmatched_tracks_a + unmatched_tracks_b))
         return matches, unmatched_tracks, unmatched_detections
 
-    def _initiate_track(self, detection, time):
-        mean, covariance = self.kf.initiate(detection.to_xyah())
+    def _initiate_track(self, measurement, centroid, feature, time):
+        mean, covariance = self.kf.initiate(measurement)
         self.tracks.append(Track(
-            mean, covariance, self._next_id, time, detection.centroid, self.n_init, 
-            self.max_age, detection.feature))
+            mean, covariance, self._next_id, time, centroid, self.n_init, 
+            self.max_age, feature))
         self._next_id += 1
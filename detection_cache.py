@@ -0,0 +1,175 @@
+from config import CACHE_CONFIG, SIZE_POLICY_CONFIG, YOLO_CONFIG, ENCODER_CONFIG, TILE_CONFIG, MIN_CONF, FRAME_SIZE
+
+import os
+import json
+import hashlib
+import numpy as np
+from deep_sort.detection import DETECTION_DTYPE
+from model_registry import detector_run_path, encoder_run_path
+
+# Blocks of the video read for its content hash
+HASH_BLOCK = 1 << 20
+HASH_BLOCKS = 16
+
+
+def _file_hash(path, full=False):
+    # Size and evenly spread blocks of the file, so long videos hash quickly
+    if os.path.isdir(path):
+        # Exported model folders, e.g. OpenVINO
+        return hashlib.sha1("".join(
+            name + _file_hash(os.path.join(path, name), full) for name in sorted(os.listdir(path))
+        ).encode()).hexdigest()
+    if not os.path.isfile(path):
+        return str(path)
+    size = os.path.getsize(path)
+    sha = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as f:
+        if full or size <= HASH_BLOCK * HASH_BLOCKS:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                sha.update(block)
+        else:
+            for offset in np.linspace(0, size - HASH_BLOCK, HASH_BLOCKS).astype(np.int64):
+                f.seek(int(offset))
+                sha.update(f.read(HASH_BLOCK))
+    return sha.hexdigest()
+
+
+def cache_key(video_path, roi=None):
+    # Everything that changes the detections or the features of a frame.
+    # Models are hashed as they are run, after export, conversion or
+    # quantization, so making them again does not reuse stale records
+    return {
+        "video": _file_hash(video_path),
+        "detector": _file_hash(detector_run_path(), full=True),
+        "backend": YOLO_CONFIG["BACKEND"],
+        "precision": YOLO_CONFIG["PRECISION"],
+        "img_size": YOLO_CONFIG["IMG_SIZE"],
+        "size_policy": SIZE_POLICY_CONFIG if SIZE_POLICY_CONFIG["ENABLED"] else None,
+        "encoder": _file_hash(encoder_run_path(), full=True),
+        "encoder_precision": ENCODER_CONFIG["PRECISION"],
+        "encoder_backend": ENCODER_CONFIG["BACKEND"],
+        "min_conf": MIN_CONF,
+        "frame_size": FRAME_SIZE,
+        "roi": roi,
+        "tiles": TILE_CONFIG if TILE_CONFIG["ENABLED"] else None
+    }
+
+
+class DetectionCache:
+    """Detections and appearance features of every processed frame of a
+    video file, kept on disk across runs.
+
+    Each combination of video content, models and detection settings gets
+    its own folder. Records are appended to flat files that are memory
+    mapped on the next run; an index maps each frame number to its records.
+    """
+
+    def __init__(self, video_path, frame_total, roi=None, cache_dir=None):
+        key = cache_key(video_path, roi)
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+        self.path = os.path.join(cache_dir or CACHE_CONFIG["DIR"], digest)
+        os.makedirs(self.path, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+        meta_file = os.path.join(self.path, "meta.json")
+        self.feature_dim = None
+        if os.path.exists(meta_file):
+            with open(meta_file) as f:
+                self.feature_dim = json.load(f)["feature_dim"]
+        else:
+            with open(meta_file, "w") as f:
+                json.dump({"key": key, "feature_dim": None}, f, default=str)
+
+        # Records written by earlier runs
+        detections_file = os.path.join(self.path, "detections.bin")
+        features_file = os.path.join(self.path, "features.bin")
+        self.records = self._map(detections_file, DETECTION_DTYPE, (-1,))
+        self.features = None
+        if self.feature_dim:
+            self.features = self._map(features_file, np.float32, (-1, self.feature_dim))
+        stored = len(self.records)
+        if self.features is not None:
+            stored = min(stored, len(self.features))
+
+        # Frame number -> (first record, record count), -1 if not cached
+        index_file = os.path.join(self.path, "index.npy")
+        shape = (frame_total + 1, 2)
+        self.index = None
+        if os.path.exists(index_file):
+            self.index = np.lib.format.open_memmap(index_file, mode="r+")
+            if self.index.shape != shape:
+                del self.index
+                self.index = None
+        if self.index is None:
+            self.index = np.lib.format.open_memmap(index_file, mode="w+", dtype=np.int64, shape=shape)
+            self.index[:] = -1
+        # Entries of a run that did not finish writing its records
+        self.index[self.index.sum(axis=1) > stored] = -1
+        self.readable = stored
+
+        self.written = stored
+        self.detections_out = open(detections_file, "r+b" if os.path.exists(detections_file) else "wb")
+        self.detections_out.seek(stored * DETECTION_DTYPE.itemsize)
+        self.detections_out.truncate()
+        self.features_out = open(features_file, "r+b" if os.path.exists(features_file) else "wb")
+        self.features_out.seek(stored * 4 * (self.feature_dim or 0))
+        self.features_out.truncate()
+
+    def _map(self, path, dtype, shape):
+        # Only whole records, a run killed while writing can leave part of
+        # one at the end, __init__ truncates it away
+        record_size = np.dtype(dtype).itemsize * int(np.prod(shape[1:]))
+        rows = os.path.getsize(path) // record_size if os.path.exists(path) else 0
+        if rows == 0:
+            return np.empty((0,) + shape[1:], dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(rows,) + shape[1:])
+
+    def get(self, frame_index):
+        """Return `(detections, features)` of a frame, or None if it is not
+        cached. `features` is None when the frame has no detections.
+        """
+        if not 0 <= frame_index < len(self.index):
+            return None
+        (start, count) = self.index[frame_index]
+        if start < 0 or start + count > self.readable:
+            self.misses += 1
+            return None
+        self.hits += 1
+        detections = np.array(self.records[start:start + count])
+        features = np.array(self.features[start:start + count]) if count > 0 else None
+        return detections, features
+
+    def put(self, frame_index, detections, features):
+        if not 0 <= frame_index < len(self.index):
+            return
+        if len(detections) > 0:
+            features = np.asarray(features, dtype=np.float32)
+            if self.feature_dim is None:
+                self._set_feature_dim(features.shape[1])
+            self.detections_out.write(np.ascontiguousarray(detections, dtype=DETECTION_DTYPE).tobytes())
+            self.features_out.write(np.ascontiguousarray(features).tobytes())
+        self.index[frame_index] = (self.written, len(detections))
+        self.written += len(detections)
+
+    def _set_feature_dim(self, feature_dim):
+        self.feature_dim = feature_dim
+        meta_file = os.path.join(self.path, "meta.json")
+        with open(meta_file) as f:
+            meta = json.load(f)
+        meta["feature_dim"] = feature_dim
+        with open(meta_file, "w") as f:
+            json.dump(meta, f)
+
+    def close(self):
+        # Records go to disk before the index entries that point to them
+        self.detections_out.close()
+        self.features_out.close()
+        self.index.flush()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached_records": self.written
+        }
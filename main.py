@@ -1,25 +1,26 @@
-from config import YOLO_CONFIG, VIDEO_CONFIG, SHOW_PROCESSING_OUTPUT, DATA_RECORD_RATE, FRAME_SIZE, TRACK_MAX_AGE, CPU_CONFIG
+from config import VIDEO_CONFIG, DATA_RECORD_RATE, FRAME_SIZE, TRACK_MAX_AGE, CPU_CONFIG, TILE_CONFIG
 
-if FRAME_SIZE > 1920:
+# Large frames are only supported with tiled detection
+if FRAME_SIZE > 1920 and not TILE_CONFIG["ENABLED"]:
     print("Frame size is too large!")
     quit()
 elif FRAME_SIZE < 480:
     print("Frame size is too small! You won't see anything")
     quit()
 
+# Thread pools have to be sized before any model is loaded
+from autotune import apply_thread_config
+apply_thread_config()
+
 import datetime
 import time
-import numpy as np
-import imutils
 import cv2
 import os
 import csv
 import json
 from video_process import video_process
-from deep_sort import nn_matching
-from deep_sort.detection import Detection
-from deep_sort.tracker import Tracker
-from deep_sort import generate_detections as gdet
+from model_registry import registry, get_encoder
+from tracking import create_tracker
 
 # Print startup information
 print("Starting Crowd-Analysis with YOLOv8...")
@@ -27,6 +28,9 @@ print(f"Processing video: {VIDEO_CONFIG['VIDEO_CAP']}")
 print(f"Frame size: {FRAME_SIZE}px")
 print(f"CPU mode: Processing every {CPU_CONFIG['FRAME_SKIP']} frames")
 
+# Load and warm up the models in the background while the video is opened
+registry.warm_up()
+
 # Read from video
 IS_CAM = VIDEO_CONFIG["IS_CAM"]
 cap = cv2.VideoCapture(VIDEO_CONFIG["VIDEO_CAP"])
@@ -36,22 +40,9 @@ cap = cv2.VideoCapture(VIDEO_CONFIG["VIDEO_CAP"])
 net = None
 ln = None
 
-# Tracker parameters
-max_cosine_distance = 0.7
-nn_budget = None
-
 # Initialize deep sort object
-if IS_CAM: 
-    max_age = VIDEO_CONFIG["CAM_APPROX_FPS"] * TRACK_MAX_AGE
-else:
-    max_age = DATA_RECORD_RATE * TRACK_MAX_AGE
-    if max_age > 30:
-        max_age = 30
-
-model_filename = 'model_data/mars-small128.pb'
-encoder = gdet.create_box_encoder(model_filename, batch_size=1)
-metric = nn_matching.NearestNeighborDistanceMetric("cosine", max_cosine_distance, nn_budget)
-tracker = Tracker(metric, max_age=max_age)
+encoder = get_encoder()
+tracker = create_tracker(IS_CAM)
 
 if not os.path.exists('processed_data'):
     os.makedirs('processed_data')
@@ -62,6 +53,14 @@ crowd_data_file = open('processed_data/crowd_data.csv', 'w')
 movement_data_writer = csv.writer(movement_data_file)
 crowd_data_writer = csv.writer(crowd_data_file)
 
+# Capture to alert latency, only measured when processing the newest camera frame
+latency_data_file = None
+latency_data_writer = None
+if IS_CAM and VIDEO_CONFIG["LATEST_FRAME"]:
+    latency_data_file = open('processed_data/latency_data.csv', 'w')
+    latency_data_writer = csv.writer(latency_data_file)
+    latency_data_writer.writerow(['Time', 'Capture To Alert (ms)', 'Dropped Frames'])
+
 if os.path.getsize('processed_data/movement_data.csv') == 0:
     movement_data_writer.writerow(['Track ID', 'Entry time', 'Exit Time', 'Movement Tracks'])
 if os.path.getsize('processed_data/crowd_data.csv') == 0:
@@ -69,14 +68,17 @@ if os.path.getsize('processed_data/crowd_data.csv') == 0:
 
 START_TIME = time.time()
 
-processing_FPS = video_process(cap, FRAME_SIZE, net, ln, encoder, tracker, movement_data_writer, crowd_data_writer)
+processing_FPS = video_process(cap, FRAME_SIZE, net, ln, encoder, tracker, movement_data_writer, crowd_data_writer, latency_data_writer)
 cv2.destroyAllWindows()
 movement_data_file.close()
 crowd_data_file.close()
+if latency_data_file:
+    latency_data_file.close()
 
 END_TIME = time.time()
 PROCESS_TIME = END_TIME - START_TIME
 print("Time elapsed: ", PROCESS_TIME)
+registry.report()
 if IS_CAM:
     print("Processed FPS: ", processing_FPS)
     VID_FPS = processing_FPS
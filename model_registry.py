@@ -0,0 +1,171 @@
+from config import YOLO_CONFIG, ENCODER_CONFIG, FRAME_SIZE
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+import numpy as np
+from autotune import thread_config, apply_torch_threads
+
+
+def int8_path(model_path):
+    # Quantized ONNX model written by quantize.py
+    return os.path.splitext(model_path)[0] + "_int8.onnx"
+
+
+# Exported model location for each runtime, relative to the weights file
+EXPORT_SUFFIX = {
+    "onnx": ".onnx",
+    "openvino": "_openvino_model"
+}
+
+
+def export_path(model_path, backend):
+    # The exported model is cached next to the weights, where ultralytics writes it
+    return os.path.splitext(model_path)[0] + EXPORT_SUFFIX[backend]
+
+
+def encoder_model_path():
+    # Encoder model selected by ENCODER_CONFIG
+    path = ENCODER_CONFIG["MODEL_PATH"]
+    if ENCODER_CONFIG["PRECISION"] == "int8":
+        path = int8_path(path)
+        if not os.path.exists(path):
+            raise FileNotFoundError("{} not found, run quantize.py to create it".format(path))
+    return path
+
+
+def detector_run_path():
+    # Detector model file or folder that is actually run for YOLO_CONFIG
+    path = YOLO_CONFIG["MODEL_PATH"]
+    if YOLO_CONFIG["PRECISION"] == "int8":
+        return int8_path(path)
+    if YOLO_CONFIG["BACKEND"] in EXPORT_SUFFIX:
+        return export_path(path, YOLO_CONFIG["BACKEND"])
+    return path
+
+
+def encoder_run_path():
+    # Encoder model file that is actually run, TensorFlow graphs are run
+    # from their ONNX conversion by the onnxruntime and opencv backends
+    path = encoder_model_path()
+    if ENCODER_CONFIG["BACKEND"] in ("onnxruntime", "opencv") and not path.endswith(".onnx"):
+        path = os.path.splitext(path)[0] + ".onnx"
+    return path
+
+
+class ModelRegistry:
+    """Models shared by everything in one process.
+
+    Each model is loaded the first time it is asked for, and only once even
+    when several threads ask at the same time. `warm_up` loads the models
+    and runs one dummy inference each on a background thread, so the first
+    real frame does not pay for it; a model being warmed up is handed out
+    once its warm-up is done. Import, load and warm-up times are kept
+    per model.
+    """
+
+    def __init__(self):
+        self.loaders = {}
+        self.warmers = {}
+        self.models = {}
+        self.locks = {}
+        self.timings = {}
+
+    def register(self, name, loader, warmer=None):
+        self.loaders[name] = loader
+        self.warmers[name] = warmer
+        self.locks[name] = threading.Lock()
+
+    @contextmanager
+    def timed(self, name, stage):
+        start = time.time()
+        yield
+        self.timings.setdefault(name, {})[stage] = round(time.time() - start, 3)
+
+    def get(self, name, warm=False):
+        model = self.models.get(name)
+        if model is None:
+            with self.locks[name]:
+                if name not in self.models:
+                    model = self.loaders[name]()
+                    # Warmed before it is handed out, models are not safe to
+                    # run from two threads at once
+                    if warm and self.warmers[name] is not None:
+                        with self.timed(name, "warm_up"):
+                            self.warmers[name](model)
+                    self.models[name] = model
+            model = self.models[name]
+        return model
+
+    def warm_up(self, names=None, background=True):
+        names = list(self.loaders) if names is None else names
+
+        def run():
+            # Models already in use are not warmed up
+            for name in names:
+                self.get(name, warm=True)
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def report(self):
+        for name, timings in self.timings.items():
+            print("Model {}: {}".format(name, ", ".join("{} {}s".format(k, v) for k, v in timings.items())))
+
+
+registry = ModelRegistry()
+
+
+def load_detector(**kwargs):
+    """Load a new YOLOv8 detector with the thread settings of this process.
+    Use `get_detector` for the shared one.
+    """
+    with registry.timed("detector", "import"):
+        from yolov8_detector import YOLOv8Detector
+    apply_torch_threads()
+    with registry.timed("detector", "load"):
+        return YOLOv8Detector(**kwargs)
+
+
+def load_encoder(model_filename=None, batch_size=None, backend=None):
+    """Load a new box encoder with the thread settings of this process. Use
+    `get_encoder` for the shared one.
+    """
+    model_filename = model_filename or encoder_model_path()
+    backend = backend or ENCODER_CONFIG["BACKEND"]
+    with registry.timed("encoder", "import"):
+        from deep_sort import generate_detections as gdet
+        if backend == "tensorflow" and not model_filename.endswith(".onnx"):
+            gdet.import_tensorflow()
+    with registry.timed("encoder", "load"):
+        return gdet.create_box_encoder(model_filename, batch_size=batch_size,
+                                       threads=thread_config()["TF_THREADS"], backend=backend)
+
+
+def _dummy_frame():
+    return np.zeros((FRAME_SIZE * 9 // 16, FRAME_SIZE, 3), dtype=np.uint8)
+
+
+def _warm_detector(detector):
+    detector.detect(_dummy_frame())
+
+
+def _warm_encoder(encoder):
+    encoder(_dummy_frame(), np.array([[0., 0., 64., 128.]]))
+
+
+registry.register("detector", load_detector, _warm_detector)
+registry.register("encoder", load_encoder, _warm_encoder)
+
+
+def get_detector():
+    return registry.get("detector")
+
+
+def get_encoder():
+    return registry.get("encoder")
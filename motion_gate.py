@@ -0,0 +1,52 @@
+import numpy as np
+import cv2
+
+# Grey level difference for a pixel to count as changed
+PIXEL_DIFF_THRESH = 25
+
+class MotionGate:
+    """Decide whether a frame changed enough to be worth running detection.
+
+    Frames are compared at a small size against the last frame that went
+    through detection, so slow changes still add up. Detection is forced
+    after `max_skip` skipped frames to keep tracks fresh.
+    """
+
+    def __init__(self, width, thresh, max_skip):
+        self.width = width
+        self.thresh = thresh
+        self.max_skip = max_skip
+        self.reference = None
+        self.skipped_run = 0
+
+        # Stats
+        self.checked = 0
+        self.skipped = 0
+
+    def _prepare(self, frame):
+        (h, w) = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, int(h * self.width / float(w)))), interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def changed(self, frame):
+        small = self._prepare(frame)
+        self.checked += 1
+        if self.reference is not None and self.reference.shape == small.shape \
+                and self.skipped_run < self.max_skip:
+            diff = cv2.absdiff(small, self.reference)
+            changed_ratio = np.count_nonzero(diff > PIXEL_DIFF_THRESH) / diff.size
+            if changed_ratio < self.thresh:
+                self.skipped += 1
+                self.skipped_run += 1
+                return False
+        self.reference = small
+        self.skipped_run = 0
+        return True
+
+    def stats(self):
+        return {
+            "checked_frames": self.checked,
+            "skipped_frames": self.skipped,
+            "skip_ratio": round(self.skipped / max(1, self.checked), 3)
+        }
@@ -0,0 +1,196 @@
+from config import MULTI_STREAM_CONFIG, VIDEO_CONFIG, SHOW_PROCESSING_OUTPUT, DATA_RECORD_RATE, FRAME_SIZE, TRACK_MAX_AGE, CPU_CONFIG
+
+# Thread pools have to be sized before any model is loaded
+from autotune import apply_thread_config
+apply_thread_config()
+
+import datetime
+import time
+import os
+import csv
+import json
+from math import lcm
+import imutils
+import cv2
+from tracking import detect_frames, track_human, predict_human, create_tracker
+from motion_gate import MotionGate
+from roi import RegionOfInterest
+from video_process import new_analysis_state, analyse_frame, end_video, record_movement_data
+from video_reader import FrameReader, PrefetchReader, LatestFrameReader
+from util import progress
+from model_registry import registry, get_encoder
+
+STREAMS = MULTI_STREAM_CONFIG["STREAMS"]
+BATCH_SIZE = MULTI_STREAM_CONFIG["BATCH_SIZE"]
+FRAME_SKIP = CPU_CONFIG["FRAME_SKIP"]
+PREFETCH_DEPTH = CPU_CONFIG["PREFETCH_DEPTH"]
+
+
+class Stream:
+    """State of one video source: its reader, tracker, analytics state and
+    output files. The detector and encoder are shared by all streams.
+    """
+
+    def __init__(self, name, video_cap, is_cam, roi=None):
+        self.name = name
+        self.is_cam = is_cam
+        self.roi = RegionOfInterest(roi) if roi else None
+        self.cap = cv2.VideoCapture(video_cap)
+
+        if is_cam:
+            self.vid_fps = None
+            self.data_record_frame = 1
+            self.time_step = 1
+        else:
+            self.vid_fps = self.cap.get(cv2.CAP_PROP_FPS)
+            self.data_record_frame = int(self.vid_fps / DATA_RECORD_RATE)
+            self.time_step = self.data_record_frame / self.vid_fps
+        # Positions of video files are written every data_record_frame frames
+        self.record_frame = None if is_cam else self.data_record_frame
+
+        # Cameras are always read on a thread of their own, so a slow or
+        # blocked camera does not hold up the other streams
+        self.latest_frame = is_cam and VIDEO_CONFIG["LATEST_FRAME"]
+        if self.latest_frame:
+            self.reader = LatestFrameReader(self.cap, FRAME_SIZE)
+        else:
+            self.reader = FrameReader(self.cap, lcm(FRAME_SKIP, self.data_record_frame), is_cam)
+            if PREFETCH_DEPTH > 0 or is_cam:
+                self.reader = PrefetchReader(self.reader, FRAME_SIZE, max(1, PREFETCH_DEPTH), is_cam)
+
+        self.tracker = create_tracker(is_cam)
+        self.state = new_analysis_state()
+        self.gate = None
+        if CPU_CONFIG["MOTION_GATE"]:
+            self.gate = MotionGate(CPU_CONFIG["MOTION_WIDTH"], CPU_CONFIG["MOTION_THRESH"], CPU_CONFIG["MOTION_MAX_SKIP"])
+        self.frame_count = 0
+        self.processed_count = 0
+        self.active = True
+
+        self.output_dir = os.path.join('processed_data', name)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.movement_data_file = open(os.path.join(self.output_dir, 'movement_data.csv'), 'w')
+        self.crowd_data_file = open(os.path.join(self.output_dir, 'crowd_data.csv'), 'w')
+        self.movement_data_writer = csv.writer(self.movement_data_file)
+        self.crowd_data_writer = csv.writer(self.crowd_data_file)
+        self.movement_data_writer.writerow(['Track ID', 'Entry time', 'Exit Time', 'Movement Tracks'])
+        self.crowd_data_writer.writerow(['Time', 'Human Count', 'Social Distance violate', 'Restricted Entry', 'Abnormal Activity'])
+
+        self.start_time = time.time()
+        self.start_datetime = datetime.datetime.now() if is_cam else VIDEO_CONFIG["START_TIME"]
+
+    def read(self):
+        (ret, frame, consumed) = self.reader.read()
+        self.frame_count += consumed
+        if not ret:
+            self.finish()
+            return None
+        if not self.reader.resizes:
+            frame = imutils.resize(frame, width=FRAME_SIZE)
+        return frame
+
+    def finish(self):
+        if not self.active:
+            return
+        self.active = False
+        end_video(self.tracker, self.frame_count, self.movement_data_writer, self.record_frame)
+        self.reader.close()
+        self.movement_data_file.close()
+        self.crowd_data_file.close()
+
+        process_time = time.time() - self.start_time
+        if self.is_cam:
+            vid_fps = round(self.processed_count / process_time, 2)
+            end_datetime = datetime.datetime.now()
+        else:
+            vid_fps = self.vid_fps
+            end_datetime = self.start_datetime + datetime.timedelta(seconds=round(self.frame_count / vid_fps))
+
+        video_data = {
+            "IS_CAM": self.is_cam,
+            "DATA_RECORD_FRAME" : self.data_record_frame,
+            "VID_FPS" : vid_fps,
+            "PROCESSED_FRAME_SIZE": FRAME_SIZE,
+            "TRACK_MAX_AGE": TRACK_MAX_AGE,
+            "START_TIME": self.start_datetime.strftime("%d/%m/%Y, %H:%M:%S"),
+            "END_TIME": end_datetime.strftime("%d/%m/%Y, %H:%M:%S")
+        }
+        with open(os.path.join(self.output_dir, 'video_data.json'), 'w') as video_data_file:
+            json.dump(video_data, video_data_file)
+        self.cap.release()
+        print("\n[{}] Processed {} frames in {:.1f}s".format(self.name, self.processed_count, process_time))
+        if self.gate is not None:
+            print("[{}] Motion gate stats: {}".format(self.name, self.gate.stats()))
+
+
+def multi_stream_process(streams, encoder):
+    display_count = 0
+    while any(stream.active for stream in streams):
+        # Take one frame from every stream that is still running, cameras
+        # without a new frame are left for the next round
+        batch = []
+        for stream in streams:
+            if not stream.active or (stream.is_cam and not stream.reader.has_frame()):
+                continue
+            frame = stream.read()
+            if frame is not None:
+                batch.append((stream, frame))
+        if len(batch) == 0:
+            # Waiting for the cameras
+            time.sleep(0.005)
+            continue
+
+        # Run detection for all streams together, leaving out static frames
+        detect = [stream.gate is None or stream.gate.changed(frame) for stream, frame in batch]
+        detections = detect_frames([frame for (_, frame), d in zip(batch, detect) if d],
+            [stream.roi for (stream, _), d in zip(batch, detect) if d], BATCH_SIZE)
+        detections = iter(detections)
+
+        for (stream, frame), d in zip(batch, detect):
+            current_datetime = datetime.datetime.now()
+            record_time = current_datetime if stream.is_cam else stream.frame_count
+            stream.processed_count += 1
+            stream.state["display_frame_count"] += 1
+
+            # Run tracking algorithm on this stream's own tracker
+            if d:
+                [humans_detected, expired] = track_human(frame, next(detections),
+                    encoder, stream.tracker, record_time)
+            else:
+                [humans_detected, expired] = predict_human(stream.tracker)
+            for movement in expired:
+                record_movement_data(stream.movement_data_writer, movement, stream.record_frame)
+
+            analyse_frame(frame, humans_detected, current_datetime, record_time, stream.time_step,
+                stream.state, stream.crowd_data_writer)
+
+            if SHOW_PROCESSING_OUTPUT:
+                cv2.imshow("Processed Output - {}".format(stream.name), frame)
+
+        display_count += 1
+        if not SHOW_PROCESSING_OUTPUT:
+            progress(display_count)
+
+        # Press 'Q' to stop all streams
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+
+    for stream in streams:
+        stream.finish()
+    cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    print("Starting multi stream Crowd-Analysis with YOLOv8...")
+    print(f"Streams: {', '.join(s['NAME'] for s in STREAMS)}")
+
+    # One encoder and one detector for all streams, loaded while the streams are opened
+    registry.warm_up()
+
+    streams = [Stream(s["NAME"], s["VIDEO_CAP"], s["IS_CAM"], s.get("ROI")) for s in STREAMS]
+    encoder = get_encoder()
+
+    START_TIME = time.time()
+    multi_stream_process(streams, encoder)
+    print("Time elapsed: ", time.time() - START_TIME)
+    registry.report()
@@ -0,0 +1,283 @@
+from config import YOLO_CONFIG, ENCODER_CONFIG, QUANT_CONFIG, FRAME_SIZE, CPU_CONFIG
+
+import os
+import re
+import glob
+import time
+import json
+import argparse
+import numpy as np
+import cv2
+from scipy.optimize import linear_sum_assignment
+from yolov8_detector import export_model
+from model_registry import int8_path, load_detector, load_encoder
+from video_reader import FrameReader, resize_to_width
+from deep_sort import nn_matching
+from deep_sort.tracker import Tracker
+from deep_sort.detection import DetectionBatch
+from deep_sort.iou_matching import iou
+from deep_sort import generate_detections as gdet
+
+CALIB_DIR = QUANT_CONFIG["CALIB_DIR"]
+# Input size of the detector
+DETECT_SIZE = YOLO_CONFIG["IMG_SIZE"]
+# Minimum IOU for a box or track of the INT8 run to be the same as one of the FP32 run
+MATCH_IOU = 0.5
+
+
+def _load_images(pattern):
+    return [cv2.imread(f) for f in sorted(glob.glob(pattern))]
+
+
+def build_calibration_set():
+    """Sample calibration frames from the calibration video and cut person
+    crops out of them with the FP32 detector. Both are saved in `CALIB_DIR`
+    and reused on the next run.
+    """
+    frames_dir = os.path.join(CALIB_DIR, "frames")
+    crops_dir = os.path.join(CALIB_DIR, "crops")
+    frames = _load_images(os.path.join(frames_dir, "*.jpg"))
+    crops = _load_images(os.path.join(crops_dir, "*.png"))
+    if frames and crops:
+        print("Using {} frames and {} crops in {}".format(len(frames), len(crops), CALIB_DIR))
+        return frames, crops
+
+    # Frames evenly spread over the video, at the processing size
+    cap = cv2.VideoCapture(QUANT_CONFIG["CALIB_VIDEO"])
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = []
+    for idx in np.linspace(0, max(0, total_frames - 1), QUANT_CONFIG["CALIB_FRAMES"]).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+        (ret, frame) = cap.read()
+        if ret:
+            frames.append(resize_to_width(frame, FRAME_SIZE))
+    cap.release()
+    if not frames:
+        raise ValueError("Could not read calibration frames from {}".format(QUANT_CONFIG["CALIB_VIDEO"]))
+
+    # Person crops as the encoder sees them
+    detector = load_detector(precision="fp32")
+    crops = []
+    for frame in frames:
+        for box in detector.detect(frame)["tlwh"]:
+            patch = gdet.extract_image_patch(frame, box, (128, 64))
+            if patch is not None:
+                crops.append(patch)
+    crops = crops[:QUANT_CONFIG["CALIB_CROPS"]]
+
+    os.makedirs(frames_dir, exist_ok=True)
+    os.makedirs(crops_dir, exist_ok=True)
+    for i, frame in enumerate(frames):
+        cv2.imwrite(os.path.join(frames_dir, "{:05d}.jpg".format(i)), frame)
+    for i, crop in enumerate(crops):
+        cv2.imwrite(os.path.join(crops_dir, "{:05d}.png".format(i)), crop)
+    print("Saved {} frames and {} crops in {}".format(len(frames), len(crops), CALIB_DIR))
+    return frames, crops
+
+
+def _letterbox(frame, size=DETECT_SIZE):
+    # Same input as the exported detector gets from ultralytics: padded square, RGB, NCHW, 0-1
+    (h, w) = frame.shape[:2]
+    r = min(size / h, size / w)
+    (nh, nw) = (int(round(h * r)), int(round(w * r)))
+    out = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    out[top:top + nh, left:left + nw] = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return np.ascontiguousarray(out[:, :, ::-1].transpose(2, 0, 1))[None].astype(np.float32) / 255.
+
+
+def _calibration_reader(input_name, batches):
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = iter(batches)
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {input_name: batch}
+
+    return Reader()
+
+
+def _input_name(onnx_path):
+    import onnxruntime as ort
+    session = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+    return session.get_inputs()[0].name
+
+
+def _head_nodes(onnx_path):
+    # Box decoding in the detection head mixes pixel coordinates and class
+    # scores in one tensor, which does not survive 8 bit activations. Only
+    # the convolutions of the head are quantized.
+    import onnx
+    nodes = onnx.load(onnx_path).graph.node
+    layers = [int(m.group(1)) for m in (re.match(r"/model\.(\d+)/", n.name) for n in nodes) if m]
+    if not layers:
+        return []
+    head = "/model.{}/".format(max(layers))
+    return [n.name for n in nodes if n.name.startswith(head) and n.op_type != "Conv"]
+
+
+def _quantize(fp32_path, int8_path, reader, nodes_to_exclude=None):
+    from onnxruntime.quantization import quantize_static, QuantFormat, QuantType
+    quantize_static(fp32_path, int8_path, reader,
+                    quant_format=QuantFormat.QDQ,
+                    per_channel=True,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    nodes_to_exclude=nodes_to_exclude or [])
+
+
+def quantize_detector(frames):
+    model_path = YOLO_CONFIG["MODEL_PATH"]
+    fp32_path = export_model(model_path, "onnx")
+    batches = [_letterbox(frame) for frame in frames]
+    _quantize(fp32_path, int8_path(model_path),
+              _calibration_reader(_input_name(fp32_path), batches), _head_nodes(fp32_path))
+    print("Wrote {}".format(int8_path(model_path)))
+
+
+def quantize_encoder(crops, batch_size=32):
+    model_path = ENCODER_CONFIG["MODEL_PATH"]
+    fp32_path = gdet.convert_to_onnx(model_path)
+    crops = np.asarray(crops, dtype=np.uint8)
+    batches = [crops[i:i + batch_size] for i in range(0, len(crops), batch_size)]
+    _quantize(fp32_path, int8_path(model_path), _calibration_reader(_input_name(fp32_path), batches))
+    print("Wrote {}".format(int8_path(model_path)))
+
+
+class _Pipeline:
+    # Detector, encoder and tracker of one precision, timed separately
+
+    def __init__(self, detector, encoder):
+        self.detector = detector
+        self.encoder = encoder
+        metric = nn_matching.NearestNeighborDistanceMetric("cosine", 0.7)
+        self.tracker = Tracker(metric, max_age=30)
+        self.detect_time = 0.
+        self.encode_time = 0.
+        self.crops = 0
+
+    def step(self, frame, frame_count):
+        t0 = time.time()
+        detections = self.detector.detect(frame)
+        self.detect_time += time.time() - t0
+        if len(detections) > 0:
+            t0 = time.time()
+            features = self.encoder(frame, detections["tlwh"])
+            self.encode_time += time.time() - t0
+            self.crops += len(detections)
+            self.tracker.predict()
+            self.tracker.update(DetectionBatch.from_array(detections, features), frame_count)
+        tracks = [(t.track_id, t.to_tlwh()) for t in self.tracker.tracks
+                  if t.is_confirmed() and t.time_since_update == 0]
+        return detections["tlwh"], tracks
+
+
+def _match(boxes_a, boxes_b):
+    # Pairs of boxes with IOU of at least MATCH_IOU, one to one
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return []
+    boxes_b = np.asarray(boxes_b, dtype=np.float64)
+    overlap = np.array([iou(np.asarray(a, dtype=np.float64), boxes_b) for a in boxes_a])
+    rows, cols = linear_sum_assignment(-overlap)
+    return [(i, j) for i, j in zip(rows, cols) if overlap[i, j] >= MATCH_IOU]
+
+
+def compare(video, max_frames):
+    """Run the FP32 and the INT8 models side by side on the same frames and
+    compare detections, track identities and speed.
+    """
+    int8_detector = os.path.exists(int8_path(YOLO_CONFIG["MODEL_PATH"]))
+    int8_encoder = os.path.exists(int8_path(ENCODER_CONFIG["MODEL_PATH"]))
+    fp32 = _Pipeline(load_detector(precision="fp32"), load_encoder(ENCODER_CONFIG["MODEL_PATH"], backend="tensorflow"))
+    int8 = _Pipeline(load_detector(precision="int8" if int8_detector else "fp32"),
+                     load_encoder(int8_path(ENCODER_CONFIG["MODEL_PATH"]) if int8_encoder
+                                  else ENCODER_CONFIG["MODEL_PATH"]))
+
+    cap = cv2.VideoCapture(video)
+    reader = FrameReader(cap, CPU_CONFIG["FRAME_SKIP"], False)
+    frame_count = 0
+    processed = 0
+    same_count = 0
+    count_diff = 0
+    fp32_boxes = 0
+    matched_boxes = 0
+    id_switches = 0
+    matched_ids = {}
+    while processed < max_frames:
+        (ret, frame, consumed) = reader.read()
+        frame_count += consumed
+        if not ret:
+            break
+        frame = resize_to_width(frame, FRAME_SIZE)
+        processed += 1
+
+        (boxes_a, tracks_a) = fp32.step(frame, frame_count)
+        (boxes_b, tracks_b) = int8.step(frame, frame_count)
+        same_count += len(boxes_a) == len(boxes_b)
+        count_diff += abs(len(boxes_a) - len(boxes_b))
+        fp32_boxes += len(boxes_a)
+        matched_boxes += len(_match(boxes_a, boxes_b))
+
+        # An FP32 track that is matched to a different INT8 track than before is an ID switch
+        for i, j in _match([box for _, box in tracks_a], [box for _, box in tracks_b]):
+            (id_a, id_b) = (tracks_a[i][0], tracks_b[j][0])
+            if id_a in matched_ids and matched_ids[id_a] != id_b:
+                id_switches += 1
+            matched_ids[id_a] = id_b
+    cap.release()
+
+    report = {
+        "video": video,
+        "frames": processed,
+        "int8_detector": int8_detector,
+        "int8_encoder": int8_encoder,
+        "count_agreement": round(same_count / max(1, processed), 4),
+        "mean_count_diff": round(count_diff / max(1, processed), 4),
+        "box_recall": round(matched_boxes / max(1, fp32_boxes), 4),
+        "id_switches": id_switches,
+        "fp32_tracks": fp32.tracker._next_id - 1,
+        "int8_tracks": int8.tracker._next_id - 1
+    }
+    for name, pipeline in (("fp32", fp32), ("int8", int8)):
+        report[name + "_detect_fps"] = round(processed / max(pipeline.detect_time, 1e-9), 2)
+        report[name + "_encode_crops_per_sec"] = round(pipeline.crops / max(pipeline.encode_time, 1e-9), 2)
+    return report
+
+
+def print_report(report):
+    print("\nINT8 vs FP32 on {} ({} frames)".format(report["video"], report["frames"]))
+    print("Frames with the same detection count: {:.1%}".format(report["count_agreement"]))
+    print("Mean detection count difference:      {}".format(report["mean_count_diff"]))
+    print("FP32 boxes found by INT8 (IOU >= {}):  {:.1%}".format(MATCH_IOU, report["box_recall"]))
+    print("Track ID switches:                    {}".format(report["id_switches"]))
+    print("Tracks created (FP32 / INT8):         {} / {}".format(report["fp32_tracks"], report["int8_tracks"]))
+    print("Detector FPS (FP32 / INT8):           {} / {}".format(report["fp32_detect_fps"], report["int8_detect_fps"]))
+    print("Encoder crops/s (FP32 / INT8):        {} / {}".format(
+        report["fp32_encode_crops_per_sec"], report["int8_encode_crops_per_sec"]))
+
+
+if __name__ == "__main__":
+    from autotune import apply_thread_config
+    apply_thread_config()
+    parser = argparse.ArgumentParser(description="INT8 quantization of the detector and the encoder")
+    parser.add_argument("--models", choices=["both", "detector", "encoder"], default="both",
+                        help="Models to quantize")
+    parser.add_argument("--report-only", action="store_true",
+                        help="Only compare the existing INT8 models against FP32")
+    args = parser.parse_args()
+
+    if not args.report_only:
+        frames, crops = build_calibration_set()
+        if args.models in ("both", "detector"):
+            quantize_detector(frames)
+        if args.models in ("both", "encoder"):
+            quantize_encoder(crops)
+
+    report = compare(QUANT_CONFIG["REPORT_VIDEO"], QUANT_CONFIG["REPORT_FRAMES"])
+    print_report(report)
+    os.makedirs('processed_data', exist_ok=True)
+    with open('processed_data/quantization_report.json', 'w') as report_file:
+        json.dump(report, report_file)
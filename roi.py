@@ -0,0 +1,72 @@
+import numpy as np
+import cv2
+from deep_sort.detection import DETECTION_DTYPE
+
+def _merge_rects(rects):
+    # Merge overlapping rectangles (x1, y1, x2, y2) so no area is detected twice
+    rects = [list(r) for r in rects]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rects[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+def offset_detections(results, offsets):
+    # Join detections of all crops, moved to frame coordinates
+    detections = np.concatenate(results) if results else np.empty(0, dtype=DETECTION_DTYPE)
+    shift = np.repeat(np.array(offsets, dtype=np.int64).reshape(-1, 2), [len(r) for r in results], axis=0)
+    detections["tlwh"][:, :2] += shift
+    detections["centroid"] += shift
+    return detections
+
+class RegionOfInterest:
+    """Restrict detection to polygon zones of the processed frame.
+
+    Only the bounding rectangles of the zones are sent to the detector, and
+    detections whose centroid falls outside every zone are dropped.
+    """
+
+    def __init__(self, polygons):
+        self.polygons = [np.array(p, dtype=np.int32).reshape(-1, 2) for p in polygons]
+        rects = []
+        for polygon in self.polygons:
+            x, y, w, h = cv2.boundingRect(polygon)
+            rects.append((x, y, x + w, y + h))
+        self.rects = _merge_rects(rects)
+        self.mask = None
+
+    def _get_mask(self, shape):
+        if self.mask is None or self.mask.shape != shape[:2]:
+            self.mask = np.zeros(shape[:2], dtype=np.uint8)
+            cv2.fillPoly(self.mask, self.polygons, 1)
+        return self.mask
+
+    def crops(self, frame):
+        # Crops of the frame to run detection on, with their top left corner
+        (h, w) = frame.shape[:2]
+        crops = []
+        for (x1, y1, x2, y2) in self.rects:
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(w, x2), min(h, y2)
+            if x2 > x1 and y2 > y1:
+                crops.append((frame[y1:y2, x1:x2], (x1, y1)))
+        return crops
+
+    def merge(self, frame, results, offsets):
+        # Map detections on crops back to frame coordinates, keep the ones inside the zones
+        mask = self._get_mask(frame.shape)
+        (h, w) = mask.shape
+        detections = offset_detections(results, offsets)
+        (cx, cy) = detections["centroid"].T
+        inside = (0 <= cx) & (cx < w) & (0 <= cy) & (cy < h)
+        inside[inside] = mask[cy[inside], cx[inside]] > 0
+        return detections[inside]
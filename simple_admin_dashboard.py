@@ -12,12 +12,13 @@ from PyQt5.QtGui import QImage, QPixmap, QColor
 import cv2
 import numpy as np
 
-# Import our existing analysis modules
-from yolov8_detector import YOLOv8Detector
+# Import our existing analysis modules, thread pools are sized before any model is loaded
+from autotune import apply_thread_config
+apply_thread_config()
 from deep_sort import nn_matching
-from deep_sort.detection import Detection
+from deep_sort.detection import DetectionBatch
 from deep_sort.tracker import Tracker
-from deep_sort import generate_detections as gdet
+from model_registry import registry, get_detector, get_encoder
 
 class VideoThread(QThread):
     frame_update = pyqtSignal(np.ndarray)
@@ -28,19 +29,20 @@ class VideoThread(QThread):
         self.video_source = video_source
         self.running = False
         
-        # Initialize detector
-        self.detector = YOLOv8Detector()
+        # Detector and encoder are shared, and loaded when the thread starts
+        self.detector = None
+        self.encoder = None
         
         # Initialize tracker
-        model_filename = 'model_data/mars-small128.pb'
         max_cosine_distance = 0.7
-        nn_budget = None
-        self.encoder = gdet.create_box_encoder(model_filename, batch_size=1)
+        nn_budget = 100
         metric = nn_matching.NearestNeighborDistanceMetric("cosine", max_cosine_distance, nn_budget)
         self.tracker = Tracker(metric, max_age=30)
         
     def run(self):
         self.running = True
+        self.detector = get_detector()
+        self.encoder = get_encoder()
         cap = cv2.VideoCapture(self.video_source)
         
         if not cap.isOpened():
@@ -89,21 +91,14 @@ class VideoThread(QThread):
         
     def process_frame(self, frame, frame_count):
         # Detect humans
-        boxes, confidences, centroids = self.detector.detect(frame)
+        detections = self.detector.detect(frame)
         
-        if len(boxes) > 0:
-            # Prepare for tracking
-            boxes_np = np.array(boxes)
-            centroids_np = np.array(centroids)
-            confidences_np = np.array(confidences)
-            
+        if len(detections) > 0:
             # Extract features
-            features = np.array(self.encoder(frame, boxes_np))
+            features = self.encoder(frame, detections["tlwh"])
             
-            # Create detections
-            detections = [Detection(bbox, score, centroid, feature) 
-                        for bbox, score, centroid, feature in 
-                        zip(boxes_np, confidences_np, centroids_np, features)]
+            # Keep the detections as arrays for the tracker
+            detections = DetectionBatch.from_array(detections, features)
             
             # Update tracker
             self.tracker.predict()
@@ -183,6 +178,9 @@ class SimpleDashboard(QMainWindow):
         # Setup database
         self.setup_database()
         
+        # Load the models in the background, the window opens right away
+        registry.warm_up()
+        
         # State
         self.is_processing = False
         self.video_source = None
@@ -0,0 +1,103 @@
+import importlib
+import numpy as np
+
+
+class SizePolicy:
+    """Picks the detector inference size for the next frames.
+
+    `select` is called before every detection call with the tracker of the
+    video and the length of the longest side of the image sent to the
+    detector. `record` keeps the detection time spent at each size.
+    Subclasses implement `select`.
+    """
+
+    def __init__(self, sizes):
+        self.sizes = sorted(sizes)
+        self.time = {size: 0. for size in self.sizes}
+        self.frames = {size: 0 for size in self.sizes}
+
+    def select(self, tracker, side):
+        raise NotImplementedError
+
+    def record(self, size, seconds, frames):
+        self.time[size] = self.time.get(size, 0.) + seconds
+        self.frames[size] = self.frames.get(size, 0) + frames
+
+    def stats(self):
+        return {size: {
+            "frames": self.frames[size],
+            "time_sec": round(self.time[size], 3),
+            "ms_per_frame": round(1000 * self.time[size] / max(1, self.frames[size]), 1)
+        } for size in self.time}
+
+
+class FixedSizePolicy(SizePolicy):
+    """Always the largest size, like running without a policy."""
+
+    def select(self, tracker, side):
+        return self.sizes[-1]
+
+
+class DensitySizePolicy(SizePolicy):
+    """Small sizes for sparse scenes of large people, large sizes for
+    crowds and for people far away.
+
+    The size is picked once every `window` calls from the confirmed tracks:
+    with `dense_count` people or more the largest size is used, otherwise
+    the smallest size at which the smaller people (10th percentile of box
+    height) still get `min_box_px` pixels. When nobody is tracked the
+    smallest size is used, and every `refresh` windows the largest size is
+    run so small people entering the scene are found.
+    """
+
+    def __init__(self, sizes, min_box_px=32, dense_count=30, window=10, refresh=5):
+        super().__init__(sizes)
+        self.min_box_px = min_box_px
+        self.dense_count = dense_count
+        self.window = max(1, window)
+        self.refresh = refresh
+        self.calls = 0
+        self.size = self.sizes[-1]
+
+    def _size_for(self, tracker, side):
+        heights = [t.to_tlwh()[3] for t in tracker.tracks
+                   if t.is_confirmed() and t.time_since_update <= 5]
+        if len(heights) == 0:
+            return self.sizes[0]
+        if len(heights) >= self.dense_count:
+            return self.sizes[-1]
+        small = np.percentile(heights, 10)
+        for size in self.sizes:
+            if small * size / side >= self.min_box_px:
+                return size
+        return self.sizes[-1]
+
+    def select(self, tracker, side):
+        if self.calls % self.window == 0:
+            window = self.calls // self.window
+            if self.refresh > 0 and window % self.refresh == self.refresh - 1:
+                self.size = self.sizes[-1]
+            else:
+                self.size = self._size_for(tracker, side)
+        self.calls += 1
+        return self.size
+
+
+POLICIES = {
+    "fixed": FixedSizePolicy,
+    "density": DensitySizePolicy
+}
+
+
+def create_policy(config):
+    """Create the policy named by `config["POLICY"]`, either one of `POLICIES`
+    or the import path of a `SizePolicy` subclass, e.g. `my_module.MyPolicy`.
+    `config["PARAMS"]` is passed to it as keyword arguments.
+    """
+    name = config["POLICY"]
+    if name in POLICIES:
+        policy_class = POLICIES[name]
+    else:
+        (module, class_name) = name.rsplit(".", 1)
+        policy_class = getattr(importlib.import_module(module), class_name)
+    return policy_class(config["SIZES"], **config.get("PARAMS", {}))
@@ -0,0 +1,50 @@
+from math import ceil
+
+# Smoothing of the measured frame cost and crowd count
+EMA_ALPHA = 0.2
+# Processed frames between two stride changes
+HOLD_FRAMES = 5
+# Crowd count above its running mean by this factor is a burst
+BURST_FACTOR = 1.5
+
+class StrideController:
+    """Choose how many source frames to advance per processed frame.
+
+    The stride is set so that processing keeps up with `target_fps` source
+    frames per second at the measured cost per frame. Bursts of people get
+    half the stride, i.e. twice the samples. The stride is a multiple of
+    `min_stride`, so processed frames stay on the data recording grid, and
+    stays between `min_stride` and `max_stride`.
+    """
+
+    def __init__(self, stride, min_stride, max_stride, target_fps, burst_min_people):
+        self.stride = stride
+        self.min_stride = min_stride
+        self.max_stride = max(min_stride, max_stride // min_stride * min_stride)
+        self.target_fps = target_fps
+        self.burst_min_people = burst_min_people
+        self.cost = None
+        self.count = None
+        self.held = 0
+
+    def update(self, cost, human_count):
+        """Feed the cost in seconds and crowd count of the last processed
+        frame. Returns the new stride if it changed, otherwise None.
+        """
+        if self.cost is None:
+            self.cost, self.count = cost, human_count
+        else:
+            self.cost += EMA_ALPHA * (cost - self.cost)
+            self.count += EMA_ALPHA * (human_count - self.count)
+        self.held += 1
+
+        steps = ceil(self.cost * self.target_fps / self.min_stride)
+        if human_count > self.burst_min_people and human_count > BURST_FACTOR * self.count:
+            steps = ceil(steps / 2)
+        stride = min(self.max_stride, max(self.min_stride, steps * self.min_stride))
+
+        if stride == self.stride or self.held < HOLD_FRAMES:
+            return None
+        self.stride = stride
+        self.held = 0
+        return stride
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from deep_sort import linear_assignment
+from deep_sort.detection import DetectionBatch
+from deep_sort.kalman_filter import KalmanFilter
+
+TOLERANCE = dict(rtol=1e-12, atol=1e-12)
+
+
+def random_measurements(rng, count):
+    # Boxes in format (x, y, a, h)
+    return np.c_[rng.uniform(0, 1920, count), rng.uniform(0, 1080, count),
+                 rng.uniform(0.2, 1., count), rng.uniform(20, 400, count)]
+
+
+def random_states(kf, rng, count, steps=5):
+    # States after a few predict/update steps, so that the covariances are
+    # not just the diagonal ones of `initiate`
+    states = [kf.initiate(m) for m in random_measurements(rng, count)]
+    for _ in range(steps):
+        states = [kf.predict(mean, covariance) for mean, covariance in states]
+        noise = np.c_[rng.normal(0, 5, (count, 2)), rng.normal(0, 0.01, count),
+                      rng.normal(0, 5, count)]
+        states = [kf.update(mean, covariance, mean[:4] + n)
+                  for (mean, covariance), n in zip(states, noise)]
+    return (np.array([mean for mean, _ in states]),
+            np.array([covariance for _, covariance in states]))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_multi_predict_matches_predict(seed):
+    kf = KalmanFilter()
+    mean, covariance = random_states(kf, np.random.default_rng(seed), 20)
+    multi_mean, multi_covariance = kf.multi_predict(mean, covariance)
+    for i in range(len(mean)):
+        single_mean, single_covariance = kf.predict(mean[i], covariance[i])
+        np.testing.assert_allclose(multi_mean[i], single_mean, **TOLERANCE)
+        np.testing.assert_allclose(multi_covariance[i], single_covariance, **TOLERANCE)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_multi_update_matches_update(seed):
+    kf = KalmanFilter()
+    rng = np.random.default_rng(seed)
+    mean, covariance = kf.multi_predict(*random_states(kf, rng, 20))
+    measurements = mean[:, :4] + rng.normal(0, 3, (len(mean), 4))
+    multi_mean, multi_covariance = kf.multi_update(mean, covariance, measurements)
+    for i in range(len(mean)):
+        single_mean, single_covariance = kf.update(mean[i], covariance[i], measurements[i])
+        np.testing.assert_allclose(multi_mean[i], single_mean, **TOLERANCE)
+        np.testing.assert_allclose(multi_covariance[i], single_covariance, **TOLERANCE)
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("only_position", [False, True])
+def test_gating_distance_matrix_matches_gating_distance(seed, only_position):
+    kf = KalmanFilter()
+    rng = np.random.default_rng(seed)
+    mean, covariance = kf.multi_predict(*random_states(kf, rng, 15))
+    tracks = [SimpleNamespace(mean=m, covariance=c) for m, c in zip(mean, covariance)]
+    # Detections near some of the tracks, and anywhere in the frame
+    xyah = np.r_[mean[:8, :4] + rng.normal(0, 10, (8, 4)) * [1, 1, 0.01, 1],
+                 random_measurements(rng, 12)]
+    tlwh = np.c_[xyah[:, :2], xyah[:, 2] * xyah[:, 3], xyah[:, 3]]
+    tlwh[:, :2] -= tlwh[:, 2:] / 2
+    detections = DetectionBatch(tlwh, np.ones(len(tlwh)), xyah[:, :2].astype(int))
+
+    matrix = linear_assignment.gating_distance_matrix(
+        kf, tracks, detections, only_position=only_position)
+    assert matrix.shape == (len(tracks), len(detections))
+    for i, track in enumerate(tracks):
+        expected = kf.gating_distance(
+            track.mean, track.covariance, detections.xyah, only_position)
+        np.testing.assert_allclose(matrix[i], expected, **TOLERANCE)
+
+    # Subsets of tracks and detections pick the same entries
+    track_indices = [3, 0, 7]
+    detection_indices = [5, 1, 11, 2]
+    subset = linear_assignment.gating_distance_matrix(
+        kf, tracks, detections, track_indices, detection_indices, only_position)
+    np.testing.assert_allclose(
+        subset, matrix[np.ix_(track_indices, detection_indices)], **TOLERANCE)
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from deep_sort.nn_matching import NearestNeighborDistanceMetric
+
+
+class ReferenceMetric:
+    # The dict-of-lists metric that the preallocated gallery replaced
+
+    def __init__(self, metric, budget):
+        self.metric = metric
+        self.budget = budget
+        self.samples = {}
+
+    def partial_fit(self, features, targets, active_targets):
+        for feature, target in zip(features, targets):
+            self.samples.setdefault(target, []).append(feature)
+            if self.budget is not None:
+                self.samples[target] = self.samples[target][-self.budget:]
+        self.samples = {k: self.samples[k] for k in active_targets if k in self.samples}
+
+    def distance(self, features, targets):
+        cost_matrix = np.zeros((len(targets), len(features)))
+        for i, target in enumerate(targets):
+            x = np.asarray(self.samples[target])
+            y = np.asarray(features)
+            if self.metric == "cosine":
+                x = x / np.linalg.norm(x, axis=1, keepdims=True)
+                y = y / np.linalg.norm(y, axis=1, keepdims=True)
+                distances = 1. - np.dot(x, y.T)
+            else:
+                distances = (-2. * np.dot(x, y.T) + np.square(x).sum(axis=1)[:, None]
+                             + np.square(y).sum(axis=1)[None, :])
+                distances = np.clip(distances, 0., float(np.inf))
+            cost_matrix[i, :] = distances.min(axis=0)
+        return cost_matrix
+
+
+def run_sequence(metric, budget, seed, steps=60, dim=16):
+    """Feed the same random sequence of samples to both metrics and compare
+    the distances after every step.
+    """
+    rng = np.random.default_rng(seed)
+    new = NearestNeighborDistanceMetric(metric, 0.5, budget)
+    reference = ReferenceMetric(metric, budget)
+    active = []
+    next_target = 1
+    for _ in range(steps):
+        # Targets leave, and new ones arrive, so slots get freed and reused
+        active = [t for t in active if rng.random() > 0.15]
+        for _ in range(rng.integers(0, 12)):
+            active.append(next_target)
+            next_target += 1
+        if not active:
+            continue
+        # Several samples of the same target in one call, and targets
+        # that get no sample at all in this step
+        targets = rng.choice(active, rng.integers(1, 3 * len(active) + 1))
+        features = rng.normal(size=(len(targets), dim)).astype(np.float32)
+        new.partial_fit(features, targets, active)
+        reference.partial_fit(features, targets, active)
+
+        known = [t for t in active if t in reference.samples]
+        queries = rng.normal(size=(int(rng.integers(1, 10)), dim)).astype(np.float32)
+        np.testing.assert_allclose(
+            new.distance(queries, known), reference.distance(queries, known),
+            rtol=1e-4, atol=1e-4)
+    return new, reference
+
+
+@pytest.mark.parametrize("metric", ["cosine", "euclidean"])
+@pytest.mark.parametrize("budget", [None, 3, 100])
+@pytest.mark.parametrize("seed", range(3))
+def test_distance_matches_reference(metric, budget, seed):
+    new, reference = run_sequence(metric, budget, seed)
+    # More targets than the first allocation, so the gallery was grown
+    assert new._valid.shape[0] > 32
+
+    # Same samples per target, oldest first
+    samples = new.samples
+    assert set(samples) == set(reference.samples)
+    for target, expected in reference.samples.items():
+        expected = np.asarray(expected)
+        if metric == "cosine":
+            expected = expected / np.linalg.norm(expected, axis=1, keepdims=True)
+        np.testing.assert_allclose(samples[target], expected, rtol=1e-6, atol=1e-6)
+
+
+@pytest.mark.parametrize("metric", ["cosine", "euclidean"])
+def test_budget_overflow(metric):
+    # One target with many more samples than the budget, so the ring wraps
+    # around several times
+    rng = np.random.default_rng(0)
+    new = NearestNeighborDistanceMetric(metric, 0.5, 3)
+    reference = ReferenceMetric(metric, 3)
+    for _ in range(10):
+        features = rng.normal(size=(int(rng.integers(1, 5)), 8)).astype(np.float32)
+        targets = np.ones(len(features), int)
+        new.partial_fit(features, targets, [1])
+        reference.partial_fit(features, targets, [1])
+        assert len(new.samples[1]) == len(reference.samples[1])
+        queries = rng.normal(size=(4, 8)).astype(np.float32)
+        np.testing.assert_allclose(
+            new.distance(queries, [1]), reference.distance(queries, [1]),
+            rtol=1e-4, atol=1e-4)
+
+
+def test_unbounded_gallery_keeps_all_samples():
+    rng = np.random.default_rng(0)
+    new = NearestNeighborDistanceMetric("euclidean", 0.5, None)
+    features = rng.normal(size=(50, 8)).astype(np.float32)
+    for feature in features:
+        new.partial_fit(feature[None], [7], [7])
+    np.testing.assert_array_equal(new.samples[7], features)
+
+
+def test_target_without_samples_is_infinitely_far():
+    new = NearestNeighborDistanceMetric("cosine", 0.5, 3)
+    queries = np.ones((2, 8), np.float32)
+    assert np.isinf(new.distance(queries, [1])).all()
+    new.partial_fit(queries[:1], [1], [1, 2])
+    cost = new.distance(queries, [1, 2])
+    np.testing.assert_allclose(cost[0], 0., atol=1e-6)
+    assert np.isinf(cost[1]).all()
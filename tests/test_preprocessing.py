@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from deep_sort.preprocessing import non_max_suppression
+
+
+def reference_non_max_suppression(boxes, max_bbox_overlap, scores=None):
+    # The one-pick-at-a-time version that non_max_suppression replaced
+    boxes = boxes.astype(np.float64)
+    pick = []
+    x1 = boxes[:, 0]
+    y1 = boxes[:, 1]
+    x2 = boxes[:, 2] + boxes[:, 0]
+    y2 = boxes[:, 3] + boxes[:, 1]
+    area = (x2 - x1 + 1) * (y2 - y1 + 1)
+    idxs = np.argsort(scores) if scores is not None else np.argsort(y2)
+    while len(idxs) > 0:
+        last = len(idxs) - 1
+        i = idxs[last]
+        pick.append(i)
+        xx1 = np.maximum(x1[i], x1[idxs[:last]])
+        yy1 = np.maximum(y1[i], y1[idxs[:last]])
+        xx2 = np.minimum(x2[i], x2[idxs[:last]])
+        yy2 = np.minimum(y2[i], y2[idxs[:last]])
+        w = np.maximum(0, xx2 - xx1 + 1)
+        h = np.maximum(0, yy2 - yy1 + 1)
+        overlap = (w * h) / area[idxs[:last]]
+        idxs = np.delete(idxs, np.concatenate(([last], np.where(overlap > max_bbox_overlap)[0])))
+    return pick
+
+
+def random_boxes(rng, count):
+    # Crowded boxes so that many of them overlap
+    xy = rng.uniform(0, 300, (count, 2))
+    wh = rng.uniform(10, 80, (count, 2))
+    return np.hstack([xy, wh])
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("with_scores", [True, False])
+def test_non_max_suppression_matches_reference(seed, with_scores):
+    rng = np.random.RandomState(seed)
+    boxes = random_boxes(rng, rng.randint(1, 200))
+    scores = rng.uniform(size=len(boxes)) if with_scores else None
+    for max_bbox_overlap in (0.3, 0.5, 0.7):
+        pick = non_max_suppression(boxes, None, max_bbox_overlap, scores)
+        assert [int(i) for i in pick] == [int(i) for i in reference_non_max_suppression(boxes, max_bbox_overlap, scores)]
+
+
+def test_non_max_suppression_empty():
+    assert non_max_suppression(np.zeros((0, 4)), None, 0.5) == []
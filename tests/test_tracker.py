@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from deep_sort import nn_matching
+from deep_sort.detection import DetectionBatch
+from deep_sort.tracker import Tracker
+
+
+def synthetic_sequence(seed, frames=80, people=6, dim=32):
+    """Boxes of people walking in straight lines, with a fixed appearance
+    each. People enter and leave at different frames and some are missed
+    now and then. Returns per frame the boxes and the features.
+    """
+    rng = np.random.default_rng(seed)
+    start = rng.uniform([50, 50], [1500, 800], (people, 2))
+    velocity = rng.uniform(-4, 4, (people, 2))
+    size = rng.uniform([30, 80], [60, 160], (people, 2))
+    appearance = rng.normal(size=(people, dim))
+    enter = rng.integers(0, frames // 3, people)
+    leave = rng.integers(2 * frames // 3, frames + 1, people)
+
+    sequence = []
+    for frame in range(frames):
+        seen = [p for p in range(people)
+                if enter[p] <= frame < leave[p] and rng.random() > 0.05]
+        tlwh = np.array([np.r_[start[p] + frame * velocity[p] + rng.normal(0, 1, 2), size[p]]
+                         for p in seen]).reshape(-1, 4)
+        features = np.array([appearance[p] + rng.normal(0, 0.05, dim)
+                             for p in seen]).reshape(-1, dim)
+        sequence.append((tlwh, features.astype(np.float32)))
+    return sequence
+
+
+def run_tracker(sequence, lazy):
+    metric = nn_matching.NearestNeighborDistanceMetric("cosine", 0.3, 100)
+    tracker = Tracker(metric, lazy_features=lazy, feature_refresh=5)
+    history = []
+    for frame, (tlwh, features) in enumerate(sequence):
+        centroid = (tlwh[:, :2] + tlwh[:, 2:] / 2).astype(int)
+        tracker.predict()
+        if lazy:
+            detections = DetectionBatch(tlwh, np.ones(len(tlwh)), centroid)
+            tracker.update(detections, frame, encode=lambda indices: features[indices])
+        else:
+            detections = DetectionBatch(tlwh, np.ones(len(tlwh)), centroid, features)
+            tracker.update(detections, frame)
+        history.append(sorted(
+            (t.track_id, t.is_confirmed(), t.time_since_update, tuple(np.round(t.to_tlwh(), 6)))
+            for t in tracker.tracks))
+    return tracker, history
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_lazy_features_give_the_same_tracks(seed):
+    sequence = synthetic_sequence(seed)
+    (_, full) = run_tracker(sequence, lazy=False)
+    (lazy_tracker, lazy) = run_tracker(sequence, lazy=True)
+
+    assert lazy == full
+    total = sum(len(tlwh) for tlwh, _ in sequence)
+    assert lazy_tracker.encoded + lazy_tracker.skipped == total
+    # Most detections of people walking apart are clear matches
+    assert lazy_tracker.skipped > total // 2
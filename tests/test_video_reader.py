@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+import pytest
+
+import video_reader
+from video_reader import FrameReader, PrefetchReader, resize_to_width
+
+FRAMES = 40
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    # Each frame is filled with a gray level that gives its index back
+    path = str(tmp_path_factory.mktemp("video") / "frames.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48))
+    for i in range(FRAMES):
+        writer.write(np.full((48, 64, 3), i * 6, np.uint8))
+    writer.release()
+    return path
+
+
+def frame_index(frame):
+    return int(round(frame.mean() / 6))
+
+
+def read_all(reader):
+    indices = []
+    total = 0
+    while True:
+        (ret, frame, consumed) = reader.read()
+        total += consumed
+        if not ret:
+            return indices, total
+        indices.append(frame_index(frame))
+
+
+@pytest.mark.parametrize("stride", [1, 3, 7])
+@pytest.mark.parametrize("seek", [False, True])
+def test_frame_reader_matches_sequential_read(video, monkeypatch, stride, seek):
+    monkeypatch.setattr(video_reader, "SEEK_MIN_STRIDE", 2 if seek else 0)
+    cap = cv2.VideoCapture(video)
+    reader = FrameReader(cap, stride, False)
+    assert reader.use_seek == (seek and stride >= 2)
+
+    (indices, total) = read_all(reader)
+
+    # Every stride-th frame, as when reading all frames and skipping
+    assert indices == list(range(stride - 1, FRAMES, stride))
+    assert total <= FRAMES
+    assert reader.position == total
+
+
+def test_frame_reader_stride_change(video, monkeypatch):
+    monkeypatch.setattr(video_reader, "SEEK_MIN_STRIDE", 0)
+    reader = FrameReader(cv2.VideoCapture(video), 2, False)
+    first = [frame_index(reader.read()[1]) for _ in range(3)]
+    reader.set_stride(5)
+    second = [frame_index(reader.read()[1]) for _ in range(3)]
+    assert first == [1, 3, 5]
+    assert second == [10, 15, 20]
+
+
+@pytest.mark.parametrize("hold", [1, 4])
+def test_prefetch_reader_matches_frame_reader(video, monkeypatch, hold):
+    monkeypatch.setattr(video_reader, "SEEK_MIN_STRIDE", 0)
+    expected = FrameReader(cv2.VideoCapture(video), 3, False)
+    reader = PrefetchReader(FrameReader(cv2.VideoCapture(video), 3, False), 32, 2, False, hold=hold)
+    held = []
+    try:
+        while True:
+            (ret, frame, consumed) = reader.read()
+            (ret_expected, frame_expected, consumed_expected) = expected.read()
+            assert (ret, consumed) == (ret_expected, consumed_expected)
+            if not ret:
+                break
+            assert frame.shape == (24, 32, 3)
+            assert np.array_equal(frame, resize_to_width(frame_expected, 32))
+            # Frames handed out stay valid for the next hold - 1 reads
+            held = (held + [(frame, frame.copy())])[-hold:]
+            for frame, copy in held:
+                assert np.array_equal(frame, copy)
+    finally:
+        reader.close()
+
+
+def test_prefetch_reader_raises_decode_errors():
+    class FailingReader:
+        def __init__(self):
+            self.reads = 0
+
+        def read(self):
+            self.reads += 1
+            if self.reads > 2:
+                raise IOError("decode failed")
+            return True, np.zeros((48, 64, 3), np.uint8), 1
+
+    reader = PrefetchReader(FailingReader(), 32, 4, False)
+    assert reader.read()[0]
+    assert reader.read()[0]
+    with pytest.raises(IOError):
+        reader.read()
+    reader.close()
@@ -0,0 +1,42 @@
+from deep_sort.preprocessing import non_max_suppression
+from roi import offset_detections
+
+def _tile_starts(length, tile_size, step):
+    # Tile start positions along one axis, the last tile ends at the frame edge
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size + 1, step))
+    if starts[-1] + tile_size < length:
+        starts.append(length - tile_size)
+    return starts
+
+class Tiler:
+    """Detect on overlapping tiles of a large frame.
+
+    Every tile is run through the detector in one batch at its native size,
+    so small people in high resolution frames keep enough pixels. Boxes are
+    moved back to frame coordinates and duplicates from the overlapping
+    parts of neighbouring tiles are removed with non-maxima suppression.
+    """
+
+    def __init__(self, tile_size, overlap, nms_thresh):
+        self.tile_size = tile_size
+        self.step = max(1, int(tile_size * (1 - overlap)))
+        self.nms_thresh = nms_thresh
+
+    def crops(self, frame):
+        (h, w) = frame.shape[:2]
+        crops = []
+        for y in _tile_starts(h, self.tile_size, self.step):
+            for x in _tile_starts(w, self.tile_size, self.step):
+                crops.append((frame[y:y + self.tile_size, x:x + self.tile_size], (x, y)))
+        return crops
+
+    def merge(self, frame, results, offsets):
+        detections = offset_detections(results, offsets)
+        if len(detections) == 0:
+            return detections
+
+        # Remove people detected twice in the overlap of two tiles
+        pick = non_max_suppression(detections["tlwh"], None, self.nms_thresh, detections["confidence"])
+        return detections[pick]
@@ -1,44 +1,133 @@
-import numpy as np
-import cv2
-from config import MIN_CONF, NMS_THRESH
-from yolov8_detector import YOLOv8Detector
+from concurrent.futures import ThreadPoolExecutor
+from config import TILE_CONFIG, VIDEO_CONFIG, CPU_CONFIG, DATA_RECORD_RATE, TRACK_MAX_AGE
+from tiling import Tiler
+from model_registry import get_detector
 
 from deep_sort import nn_matching
-from deep_sort.detection import Detection
+from deep_sort.detection import DetectionBatch
 from deep_sort.tracker import Tracker
-from deep_sort import generate_detections as gdet
 
-# Initialize YOLOv8 detector
-detector = YOLOv8Detector()
+# Tracker parameters, shared by every entry point
+MAX_COSINE_DISTANCE = 0.7
+NN_BUDGET = 100
 
-def detect_human(net, ln, frame, encoder, tracker, time):
-    # Run YOLOv8 detection
-    boxes, confidences, centroids = detector.detect(frame)
-    
+# Detect on tiles of the full resolution frame
+tiler = None
+if TILE_CONFIG["ENABLED"]:
+    tiler = Tiler(TILE_CONFIG["TILE_SIZE"], TILE_CONFIG["OVERLAP"], TILE_CONFIG["NMS_THRESH"])
+
+class FeaturePipeline:
+    """Runs the appearance encoder on a worker thread, so the features of
+    detected frames are computed while the next frames are detected. The
+    encoder and the detector release the GIL while they run. Features are
+    returned as futures; resolving them in frame order keeps the tracker
+    updates in order.
+    """
+
+    def __init__(self, encoder):
+        self.encoder = encoder
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def submit(self, frame, detections):
+        return self.executor.submit(self.encoder, frame, detections["tlwh"])
+
+    def close(self):
+        self.executor.shutdown()
+
+def create_tracker(is_cam):
+    """Deep SORT tracker of one video source. Tracks are deleted after about
+    TRACK_MAX_AGE seconds without a detection.
+    """
+    if is_cam:
+        max_age = VIDEO_CONFIG["CAM_APPROX_FPS"] * TRACK_MAX_AGE
+    else:
+        max_age = min(DATA_RECORD_RATE * TRACK_MAX_AGE, 30)
+    metric = nn_matching.NearestNeighborDistanceMetric("cosine", MAX_COSINE_DISTANCE, NN_BUDGET)
+    return Tracker(metric, max_age=max_age,
+                   lazy_features=CPU_CONFIG["LAZY_FEATURES"], feature_refresh=CPU_CONFIG["FEATURE_REFRESH"])
+
+def _confirmed_tracks(tracker):
+    # Get confirmed tracks
+    tracked_bboxes = []
+    for track in tracker.tracks:
+        if not track.is_confirmed() or track.time_since_update > 5:
+            continue
+        tracked_bboxes.append(track)
+    return tracked_bboxes
+
+def track_human(frame, detections, encoder, tracker, time, features=None):
     tracked_bboxes = []
     expired = []
     
-    if len(boxes) > 0:
-        # Convert to numpy arrays
-        boxes = np.array(boxes)
-        centroids = np.array(centroids)
-        confidences = np.array(confidences)
+    if len(detections) > 0:
+        # Extract features for tracking, unless they come from the cache or
+        # the tracker only asks for the ones it needs
+        if features is None and not tracker.lazy_features:
+            features = encoder(frame, detections["tlwh"])
         
-        # Extract features for tracking
-        features = np.array(encoder(frame, boxes))
-        
-        # Create detection objects
-        detections = [Detection(bbox, score, centroid, feature) for bbox, score, centroid, feature in 
-                    zip(boxes, confidences, centroids, features)]
+        # Keep the detections as arrays for the tracker
+        detections = DetectionBatch.from_array(detections, features)
         
         # Update tracker
         tracker.predict()
-        expired = tracker.update(detections, time)
+        expired = tracker.update(detections, time, lambda indices: encoder(frame, detections.tlwh[indices]))
         
-        # Get confirmed tracks
-        for track in tracker.tracks:
-            if not track.is_confirmed() or track.time_since_update > 5:
-                continue
-            tracked_bboxes.append(track)
+        tracked_bboxes = _confirmed_tracks(tracker)
+    
+    return [tracked_bboxes, expired]
+
+def predict_human(tracker):
+    # No detection on this frame, tracks move with their motion model only.
+    # Not a miss, so new tracks survive until the next detection
+    tracker.predict(missed=False)
+    return [_confirmed_tracks(tracker), []]
+
+def detect_frames(frames, rois=None, batch_size=32, img_size=None):
+    """Run YOLOv8 detection over several frames in as few calls as possible.
+    Frames with a region of interest, or all frames when tiling, are sent as
+    one crop per region or tile. Returns an array of `DETECTION_DTYPE`
+    records per frame. `img_size` overrides the configured inference size.
+    """
+    if rois is None:
+        rois = [None] * len(frames)
+    parts = []
+    for frame, roi in zip(frames, rois):
+        splitter = roi or tiler
+        parts.append(splitter.crops(frame) if splitter else [(frame, (0, 0))])
+
+    crops = [crop for frame_parts in parts for crop, _ in frame_parts]
+    results = []
+    for i in range(0, len(crops), batch_size):
+        results += get_detector().detect_batch(crops[i:i + batch_size], img_size)
+
+    detections = []
+    for frame, roi, frame_parts in zip(frames, rois, parts):
+        frame_results, results = results[:len(frame_parts)], results[len(frame_parts):]
+        splitter = roi or tiler
+        if splitter:
+            detections.append(splitter.merge(frame, frame_results, [offset for _, offset in frame_parts]))
+        else:
+            detections.append(frame_results[0])
+    return detections
+
+def detect_cached(frame, frame_index, encoder, cache, roi=None):
+    """Detections and features of a frame, read from the detection cache or
+    computed and added to it. Features are None when nothing is detected.
+    """
+    cached = cache.get(frame_index)
+    if cached is not None:
+        return cached
+    detections = detect_frames([frame], [roi])[0]
+    features = encoder(frame, detections["tlwh"]) if len(detections) > 0 else None
+    cache.put(frame_index, detections, features)
+    return detections, features
+
+def detect_human(net, ln, frame, encoder, tracker, time, roi=None, cache=None, frame_index=None):
+    # Run YOLOv8 detection, only inside the regions of interest if given
+    features = None
+    if cache is not None:
+        detections, features = detect_cached(frame, frame_index, encoder, cache, roi)
+    else:
+        detections = detect_frames([frame], [roi])[0]
     
-    return [tracked_bboxes, expired]
\ No newline at end of file
+    return track_human(frame, detections, encoder, tracker, time, features)
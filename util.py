@@ -1,3 +1,4 @@
+import numpy as np
 from scipy.spatial.distance import euclidean
 
 # Calculate shortest distance between two rectangle
@@ -43,4 +44,11 @@ def progress(frame_count):
 
 def kinetic_energy(point1, point2, time_step):
 	speed = euclidean(point1, point2) / time_step
-	return int(0.5 * speed ** 2)
\ No newline at end of file
+	return int(0.5 * speed ** 2)
+
+# Positions interpolated every step frames, as if recorded at a fixed rate
+def fixed_rate_positions(positions, frames, step):
+	grid = np.arange(frames[0], frames[-1] + 1, step)
+	x = np.interp(grid, frames, [p[0] for p in positions])
+	y = np.interp(grid, frames, [p[1] for p in positions])
+	return [[int(round(a)), int(round(b))] for a, b in zip(x, y)]
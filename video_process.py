@@ -3,27 +3,46 @@ import datetime
 import numpy as np
 import imutils
 import cv2
-import time
-from math import ceil
+from math import ceil, lcm
 from scipy.spatial.distance import euclidean
-from tracking import detect_human
-from util import rect_distance, progress, kinetic_energy
+from collections import deque
+from concurrent.futures import Future
+from tracking import detect_frames, track_human, predict_human, FeaturePipeline
+from motion_gate import MotionGate
+from roi import RegionOfInterest
+from stride_controller import StrideController
+from detection_cache import DetectionCache
+from size_policy import create_policy
+from util import rect_distance, progress, kinetic_energy, fixed_rate_positions
 from colors import RGB_COLORS
 from config import SHOW_DETECT, DATA_RECORD, RE_CHECK, RE_START_TIME, RE_END_TIME, SD_CHECK, SHOW_VIOLATION_COUNT, SHOW_TRACKING_ID, SOCIAL_DISTANCE,\
-    SHOW_PROCESSING_OUTPUT, YOLO_CONFIG, VIDEO_CONFIG, DATA_RECORD_RATE, ABNORMAL_CHECK, ABNORMAL_ENERGY, ABNORMAL_THRESH, ABNORMAL_MIN_PEOPLE, CPU_CONFIG
-from deep_sort import nn_matching
-from deep_sort.detection import Detection
-from deep_sort.tracker import Tracker
-from deep_sort import generate_detections as gdet
+    SHOW_PROCESSING_OUTPUT, VIDEO_CONFIG, DATA_RECORD_RATE, ABNORMAL_CHECK, ABNORMAL_ENERGY, ABNORMAL_THRESH, ABNORMAL_MIN_PEOPLE, CPU_CONFIG,\
+    TRACK_MAX_AGE, CACHE_CONFIG, SIZE_POLICY_CONFIG, TILE_CONFIG
+from video_reader import FrameReader, PrefetchReader, LatestFrameReader
 IS_CAM = VIDEO_CONFIG["IS_CAM"]
 HIGH_CAM = VIDEO_CONFIG["HIGH_CAM"]
+LATEST_FRAME = IS_CAM and VIDEO_CONFIG["LATEST_FRAME"]
 FRAME_SKIP = CPU_CONFIG["FRAME_SKIP"]
+PREFETCH_DEPTH = CPU_CONFIG["PREFETCH_DEPTH"]
+MOTION_GATE = CPU_CONFIG["MOTION_GATE"]
+ADAPTIVE_STRIDE = CPU_CONFIG["ADAPTIVE_STRIDE"] and not IS_CAM
+CACHE = CACHE_CONFIG["ENABLED"] and not IS_CAM
+# Live cameras want the newest frame, not the next one detected ahead. The
+# size policy needs the tracks of a batch before the next one is detected
+PIPELINE = CPU_CONFIG["PIPELINE_ENCODER"] and not LATEST_FRAME and not CPU_CONFIG["LAZY_FEATURES"] \
+    and not SIZE_POLICY_CONFIG["ENABLED"]
+# Cameras detect every frame on its own to keep latency low
+DETECT_BATCH = 1 if IS_CAM else max(1, CPU_CONFIG["DETECT_BATCH"])
 
-def _record_movement_data(movement_data_writer, movement):
+def record_movement_data(movement_data_writer, movement, record_frame=None):
     track_id = movement.track_id 
     entry_time = movement.entry 
     exit_time = movement.exit            
     positions = movement.positions
+    # Video files keep one position every record_frame frames, whatever the
+    # frames the track was actually updated on
+    if record_frame is not None:
+        positions = fixed_rate_positions(positions, movement.times, record_frame)
     positions = np.array(positions).flatten()
     positions = list(positions)
     data = [track_id] + [entry_time] + [exit_time] + positions
@@ -33,15 +52,198 @@ def _record_crowd_data(time, human_count, violate_count, restricted_entry, abnor
     data = [time, human_count, violate_count, int(restricted_entry), int(abnormal_activity)]
     crowd_data_writer.writerow(data)
 
-def _end_video(tracker, frame_count, movement_data_writer):
+def _record_latency_data(time, latency, dropped, latency_data_writer):
+    data = [time, round(latency * 1000, 1), dropped]
+    latency_data_writer.writerow(data)
+
+def _print_latency(latencies):
+    if len(latencies) == 0:
+        return
+    latencies = np.array(latencies) * 1000
+    print("Capture to alert latency (ms): mean {:.1f}, p95 {:.1f}, max {:.1f}".format(
+        latencies.mean(), np.percentile(latencies, 95), latencies.max()))
+
+def end_video(tracker, frame_count, movement_data_writer, record_frame=None):
     for t in tracker.tracks:
         if t.is_confirmed():
             t.exit = frame_count
-            _record_movement_data(movement_data_writer, t)
+            record_movement_data(movement_data_writer, t, record_frame)
+        
+
+def new_analysis_state():
+    # Per stream state carried between frames by analyse_frame
+    return {
+        "display_frame_count": 0,
+        "re_warning_timeout": 0,
+        "sd_warning_timeout": 0,
+        "ab_warning_timeout": 0
+    }
+
+def analyse_frame(frame, humans_detected, current_datetime, record_time, time_step, state, crowd_data_writer):
+    RE = False
+    ABNORMAL = False
+
+    # Check for restricted entry
+    if RE_CHECK:
+        RE = False
+        if (current_datetime.time() > RE_START_TIME) and (current_datetime.time() < RE_END_TIME) :
+            if len(humans_detected) > 0:
+                RE = True
+        
+    # Initiate video process loop
+    if SHOW_PROCESSING_OUTPUT or SHOW_DETECT or SD_CHECK or RE_CHECK or ABNORMAL_CHECK:
+        # Initialize set for violate so an individual will be recorded only once
+        violate_set = set()
+        # Initialize list to record violation count for each individual detected
+        violate_count = np.zeros(len(humans_detected))
+
+        # Initialize list to record id of individual with abnormal energy level
+        abnormal_individual = []
+        ABNORMAL = False
+        for i, track in enumerate(humans_detected):
+            # Get object bounding box
+            [x, y, w, h] = list(map(int, track.to_tlbr().tolist()))
+            # Get object centroid
+            [cx, cy] = list(map(int, track.positions[-1]))
+            # Get object id
+            idx = track.track_id
+            # Check for social distance violation
+            if SD_CHECK:
+                if len(humans_detected) >= 2:
+                    # Check the distance between current loop object with the rest of the object in the list
+                    for j, track_2 in enumerate(humans_detected[i+1:], start=i+1):
+                        if HIGH_CAM:
+                            [cx_2, cy_2] = list(map(int, track_2.positions[-1]))
+                            distance = euclidean((cx, cy), (cx_2, cy_2))
+                        else:
+                            [x_2, y_2, w_2, h_2] = list(map(int, track_2.to_tlbr().tolist()))
+                            distance = rect_distance((x, y, w, h), (x_2, y_2, w_2, h_2))
+                        if distance < SOCIAL_DISTANCE:
+                            # Distance between detection less than minimum social distance 
+                            violate_set.add(i)
+                            violate_count[i] += 1
+                            violate_set.add(j)
+                            violate_count[j] += 1
+
+            # Compute energy level for each detection
+            if ABNORMAL_CHECK:
+                ke = kinetic_energy(track.positions[-1], track.positions[-2], time_step)
+                if ke > ABNORMAL_ENERGY:
+                    abnormal_individual.append(track.track_id)
+
+            # If restrited entry is on, draw red boxes around each detection
+            if RE:
+                cv2.rectangle(frame, (x + 5 , y + 5 ), (w - 5, h - 5), RGB_COLORS["red"], 5)
+
+            # Draw yellow boxes for detection with social distance violation, green boxes for no violation
+            # Place a number of violation count on top of the box
+            if i in violate_set:
+                cv2.rectangle(frame, (x, y), (w, h), RGB_COLORS["yellow"], 2)
+                if SHOW_VIOLATION_COUNT:
+                    cv2.putText(frame, str(int(violate_count[i])), (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, RGB_COLORS["yellow"], 2)
+            elif SHOW_DETECT and not RE:
+                cv2.rectangle(frame, (x, y), (w, h), RGB_COLORS["green"], 2)
+                if SHOW_VIOLATION_COUNT:
+                    cv2.putText(frame, str(int(violate_count[i])), (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, RGB_COLORS["green"], 2)
+            
+            if SHOW_TRACKING_ID:
+                cv2.putText(frame, str(int(idx)), (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, RGB_COLORS["green"], 2)
         
+        # Check for overall abnormal level, trigger notification if exceeds threshold
+        if len(humans_detected)  > ABNORMAL_MIN_PEOPLE:
+            if len(abnormal_individual) / len(humans_detected) > ABNORMAL_THRESH:
+                ABNORMAL = True
+
+    # Place violation count on frames
+    if SD_CHECK:
+        # Warning stays on screen for 10 frames
+        if (len(violate_set) > 0):
+            state["sd_warning_timeout"] = 10
+        else: 
+            state["sd_warning_timeout"] -= 1
+        # Display violation warning and count on screen
+        if state["sd_warning_timeout"] > 0:
+            text = "Violation count: {}".format(len(violate_set))
+            cv2.putText(frame, text, (200, frame.shape[0] - 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
+
+    # Place restricted entry warning
+    if RE_CHECK:
+        # Warning stays on screen for 10 frames
+        if RE:
+            state["re_warning_timeout"] = 10
+        else: 
+            state["re_warning_timeout"] -= 1
+        # Display restricted entry warning and count on screen
+        if state["re_warning_timeout"] > 0:
+            if state["display_frame_count"] % 3 != 0 :
+                cv2.putText(frame, "RESTRICTED ENTRY", (200, 100),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, RGB_COLORS["red"], 3)
+
+    # Place abnormal activity warning
+    if ABNORMAL_CHECK:
+        if ABNORMAL:
+            # Warning stays on screen for 10 frames
+            state["ab_warning_timeout"] = 10
+            # Draw blue boxes over the the abnormally behave detection if abnormal activity detected
+            for track in humans_detected:
+                if track.track_id in abnormal_individual:
+                    [x, y, w, h] = list(map(int, track.to_tlbr().tolist()))
+                    cv2.rectangle(frame, (x , y ), (w, h), RGB_COLORS["blue"], 5)
+        else:
+            state["ab_warning_timeout"] -= 1
+        if state["ab_warning_timeout"] > 0:
+            if state["display_frame_count"] % 3 != 0:
+                cv2.putText(frame, "ABNORMAL ACTIVITY", (130, 250),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.5, RGB_COLORS["blue"], 5)
+
+    # Display crowd count on screen
+    if SHOW_DETECT:
+        text = "Crowd count: {}".format(len(humans_detected))
+        cv2.putText(frame, text, (10, 30),
+            cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 3)
+    
+    # Record crowd data to file
+    if DATA_RECORD:
+        _record_crowd_data(record_time, len(humans_detected), len(violate_set), RE, ABNORMAL, crowd_data_writer)
+
+    return RE, ABNORMAL
+
+def _read_batch(reader, frame_size, gate, roi, batch_size, cache=None, position=0, img_size=None, size_policy=None):
+    # Read up to batch_size frames and detect the ones that need it in one call.
+    # Frames skipped by the motion gate get None detections, frames found in
+    # the cache come with their features.
+    batch = []
+    while len(batch) < batch_size:
+        (ret, frame, consumed) = reader.read()
+        position += consumed
+        if not ret:
+            batch.append((ret, frame, consumed, False, None))
+            break
+        # Resize Frame to given size
+        if not reader.resizes:
+            frame = imutils.resize(frame, width=frame_size)
+        d = gate is None or gate.changed(frame)
+        cached = cache.get(position) if d and cache is not None else None
+        batch.append((ret, frame, consumed, d, cached))
 
-def video_process(cap, frame_size, net, ln, encoder, tracker, movement_data_writer, crowd_data_writer):
+    detect = [frame for ret, frame, _, d, cached in batch if ret and d and cached is None]
+    start = time.time()
+    detections = iter(detect_frames(detect, [roi] * len(detect), img_size=img_size))
+    if size_policy is not None and detect:
+        size_policy.record(img_size, time.time() - start, len(detect))
+    out = deque()
+    for ret, frame, consumed, d, cached in batch:
+        if not (ret and d):
+            cached = (None, None)
+        elif cached is None:
+            cached = (next(detections), None)
+        out.append((ret, frame, consumed) + cached)
+    return out
+
+def video_process(cap, frame_size, net, ln, encoder, tracker, movement_data_writer, crowd_data_writer, latency_data_writer=None):
     def _calculate_FPS():
+        nonlocal VID_FPS
         t1 = time.time() - t0
         VID_FPS = frame_count / t1
 
@@ -54,22 +256,87 @@ def video_process(cap, frame_size, net, ln, encoder, tracker, movement_data_writ
         VID_FPS = cap.get(cv2.CAP_PROP_FPS)
         DATA_RECORD_FRAME = int(VID_FPS / DATA_RECORD_RATE)
         TIME_STEP = DATA_RECORD_FRAME/VID_FPS
+    # Camera tracks are timed by date, their positions are kept as they come
+    RECORD_FRAME = None if IS_CAM else DATA_RECORD_FRAME
 
-    frame_count = 0
-    display_frame_count = 0
-    re_warning_timeout = 0
-    sd_warning_timeout = 0
-    ab_warning_timeout = 0
+    if LATEST_FRAME:
+        # Live camera, always process the newest frame
+        reader = LatestFrameReader(cap, frame_size)
+    else:
+        # Only every FRAME_SKIP-th and DATA_RECORD_FRAME-th frame is processed
+        reader_stride = lcm(FRAME_SKIP, DATA_RECORD_FRAME)
+        reader = FrameReader(cap, reader_stride, IS_CAM)
+        # Decode and resize ahead of detection on a background thread
+        if PREFETCH_DEPTH > 0:
+            # Frames stay in use for one batch, two when the next batch is read ahead
+            reader = PrefetchReader(reader, frame_size, PREFETCH_DEPTH, IS_CAM, hold=DETECT_BATCH * (2 if PIPELINE else 1))
+    latencies = []
 
-    RE = False
-    ABNORMAL = False
+    # Skip detection on frames where nothing moved
+    gate = None
+    if MOTION_GATE:
+        gate = MotionGate(CPU_CONFIG["MOTION_WIDTH"], CPU_CONFIG["MOTION_THRESH"], CPU_CONFIG["MOTION_MAX_SKIP"])
+
+    # Adjust the stride to the processing cost, video files only
+    controller = None
+    if ADAPTIVE_STRIDE:
+        target_fps = CPU_CONFIG["TARGET_FPS"] or VID_FPS
+        # Tracks are deleted after tracker.max_age missed frames, that must
+        # stay TRACK_MAX_AGE seconds whatever the stride, and at least n_init frames
+        max_stride = int(TRACK_MAX_AGE * VID_FPS / tracker.n_init)
+        # Strides stay multiples of reader_stride, the data recording rate
+        controller = StrideController(reader_stride, reader_stride, max_stride, target_fps, ABNORMAL_MIN_PEOPLE)
+
+    # Only detect inside the configured zones
+    roi = RegionOfInterest(VIDEO_CONFIG["ROI"]) if VIDEO_CONFIG["ROI"] else None
+
+    # Reuse detections and features of earlier runs on the same video
+    cache = None
+    if CACHE:
+        cache = DetectionCache(VIDEO_CONFIG["VIDEO_CAP"], int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), VIDEO_CONFIG["ROI"])
+
+    # Inference size from the tracked people, the detector sees tiles when tiling
+    size_policy = None
+    if SIZE_POLICY_CONFIG["ENABLED"]:
+        size_policy = create_policy(SIZE_POLICY_CONFIG)
+        detector_side = TILE_CONFIG["TILE_SIZE"] if TILE_CONFIG["ENABLED"] else frame_size
+
+    # Encode on a worker thread while the next batch is detected
+    pipeline = FeaturePipeline(encoder) if PIPELINE else None
+
+    def _next_batch(position):
+        img_size = size_policy.select(tracker, detector_side) if size_policy is not None else None
+        out = _read_batch(reader, frame_size, gate, roi, DETECT_BATCH, cache, position, img_size, size_policy)
+        if pipeline is not None:
+            out = deque((ret, frame, consumed, detections,
+                         pipeline.submit(frame, detections) if features is None and detections is not None
+                         and len(detections) > 0 else features)
+                        for ret, frame, consumed, detections, features in out)
+        return out
+
+    frame_count = 0
+    # Frame number in the video, unlike frame_count it is never reset
+    position = 0
+    state = new_analysis_state()
+    batch = deque()
+    upcoming = None
 
     while True:
-        (ret, frame) = cap.read()
+        loop_start = time.time()
+        # Offline runs detect several frames at a time
+        if not batch:
+            batch = upcoming if upcoming is not None else _next_batch(position)
+            upcoming = None
+            if pipeline is not None and batch[-1][0]:
+                # Detect the next frames while the worker encodes these
+                upcoming = _next_batch(position + sum(entry[2] for entry in batch))
+        (ret, frame, consumed, detections, features) = batch.popleft()
+        frame_count += consumed
+        position += consumed
 
         # Stop the loop when video ends
         if not ret:
-            _end_video(tracker, frame_count, movement_data_writer)
+            end_video(tracker, frame_count, movement_data_writer, RECORD_FRAME)
             if not VID_FPS:
                 _calculate_FPS()
             break
@@ -78,22 +345,10 @@ def video_process(cap, frame_size, net, ln, encoder, tracker, movement_data_writ
         if frame_count > 1000000:
             if not VID_FPS:
                 _calculate_FPS()
-            frame_count = 0
-            display_frame_count = 0
-        frame_count += 1
-        
-        # Skip frames for CPU performance
-        if frame_count % FRAME_SKIP != 0:
-            continue
-            
-        # Skip frames according to given rate
-        if frame_count % DATA_RECORD_FRAME != 0:
-            continue
-
-        display_frame_count += 1
+            frame_count = consumed
+            state["display_frame_count"] = 0
 
-        # Resize Frame to given size
-        frame = imutils.resize(frame, width=frame_size)
+        state["display_frame_count"] += 1
 
         # Get current time
         current_datetime = datetime.datetime.now()
@@ -105,150 +360,79 @@ def video_process(cap, frame_size, net, ln, encoder, tracker, movement_data_writ
             record_time = frame_count
         
         # Run tracking algorithm
-        [humans_detected, expired] = detect_human(net, ln, frame, encoder, tracker, record_time)
+        if detections is not None:
+            fresh = features is None or isinstance(features, Future)
+            if isinstance(features, Future):
+                # Encoded on the pipeline worker
+                features = features.result()
+            if cache is not None and fresh:
+                # Not cached yet
+                if features is None and len(detections) > 0:
+                    features = encoder(frame, detections["tlwh"])
+                cache.put(position, detections, features)
+            [humans_detected, expired] = track_human(frame, detections, encoder, tracker, record_time, features)
+        else:
+            [humans_detected, expired] = predict_human(tracker)
 
         # Record movement data
         for movement in expired:
-            _record_movement_data(movement_data_writer, movement)
+            record_movement_data(movement_data_writer, movement, RECORD_FRAME)
         
-        # Check for restricted entry
-        if RE_CHECK:
-            RE = False
-            if (current_datetime.time() > RE_START_TIME) and (current_datetime.time() < RE_END_TIME) :
-                if len(humans_detected) > 0:
-                    RE = True
-            
-        # Initiate video process loop
-        if SHOW_PROCESSING_OUTPUT or SHOW_DETECT or SD_CHECK or RE_CHECK or ABNORMAL_CHECK:
-            # Initialize set for violate so an individual will be recorded only once
-            violate_set = set()
-            # Initialize list to record violation count for each individual detected
-            violate_count = np.zeros(len(humans_detected))
-
-            # Initialize list to record id of individual with abnormal energy level
-            abnormal_individual = []
-            ABNORMAL = False
-            for i, track in enumerate(humans_detected):
-                # Get object bounding box
-                [x, y, w, h] = list(map(int, track.to_tlbr().tolist()))
-                # Get object centroid
-                [cx, cy] = list(map(int, track.positions[-1]))
-                # Get object id
-                idx = track.track_id
-                # Check for social distance violation
-                if SD_CHECK:
-                    if len(humans_detected) >= 2:
-                        # Check the distance between current loop object with the rest of the object in the list
-                        for j, track_2 in enumerate(humans_detected[i+1:], start=i+1):
-                            if HIGH_CAM:
-                                [cx_2, cy_2] = list(map(int, track_2.positions[-1]))
-                                distance = euclidean((cx, cy), (cx_2, cy_2))
-                            else:
-                                [x_2, y_2, w_2, h_2] = list(map(int, track_2.to_tlbr().tolist()))
-                                distance = rect_distance((x, y, w, h), (x_2, y_2, w_2, h_2))
-                            if distance < SOCIAL_DISTANCE:
-                                # Distance between detection less than minimum social distance 
-                                violate_set.add(i)
-                                violate_count[i] += 1
-                                violate_set.add(j)
-                                violate_count[j] += 1
-
-                # Compute energy level for each detection
-                if ABNORMAL_CHECK:
-                    ke = kinetic_energy(track.positions[-1], track.positions[-2], TIME_STEP)
-                    if ke > ABNORMAL_ENERGY:
-                        abnormal_individual.append(track.track_id)
-
-                # If restrited entry is on, draw red boxes around each detection
-                if RE:
-                    cv2.rectangle(frame, (x + 5 , y + 5 ), (w - 5, h - 5), RGB_COLORS["red"], 5)
-
-                # Draw yellow boxes for detection with social distance violation, green boxes for no violation
-                # Place a number of violation count on top of the box
-                if i in violate_set:
-                    cv2.rectangle(frame, (x, y), (w, h), RGB_COLORS["yellow"], 2)
-                    if SHOW_VIOLATION_COUNT:
-                        cv2.putText(frame, str(int(violate_count[i])), (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, RGB_COLORS["yellow"], 2)
-                elif SHOW_DETECT and not RE:
-                    cv2.rectangle(frame, (x, y), (w, h), RGB_COLORS["green"], 2)
-                    if SHOW_VIOLATION_COUNT:
-                        cv2.putText(frame, str(int(violate_count[i])), (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, RGB_COLORS["green"], 2)
-                
-                if SHOW_TRACKING_ID:
-                    cv2.putText(frame, str(int(idx)), (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, RGB_COLORS["green"], 2)
-            
-            # Check for overall abnormal level, trigger notification if exceeds threshold
-            if len(humans_detected)  > ABNORMAL_MIN_PEOPLE:
-                if len(abnormal_individual) / len(humans_detected) > ABNORMAL_THRESH:
-                    ABNORMAL = True
+        # Movement speed is measured over the frames actually advanced
+        if controller is not None:
+            TIME_STEP = consumed / VID_FPS
 
-        # Place violation count on frames
-        if SD_CHECK:
-            # Warning stays on screen for 10 frames
-            if (len(violate_set) > 0):
-                sd_warning_timeout = 10
-            else: 
-                sd_warning_timeout -= 1
-            # Display violation warning and count on screen
-            if sd_warning_timeout > 0:
-                text = "Violation count: {}".format(len(violate_set))
-                cv2.putText(frame, text, (200, frame.shape[0] - 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
-
-        # Place restricted entry warning
-        if RE_CHECK:
-            # Warning stays on screen for 10 frames
-            if RE:
-                re_warning_timeout = 10
-            else: 
-                re_warning_timeout -= 1
-            # Display restricted entry warning and count on screen
-            if re_warning_timeout > 0:
-                if display_frame_count % 3 != 0 :
-                    cv2.putText(frame, "RESTRICTED ENTRY", (200, 100),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, RGB_COLORS["red"], 3)
-
-        # Place abnormal activity warning
-        if ABNORMAL_CHECK:
-            if ABNORMAL:
-                # Warning stays on screen for 10 frames
-                ab_warning_timeout = 10
-                # Draw blue boxes over the the abnormally behave detection if abnormal activity detected
-                for track in humans_detected:
-                    if track.track_id in abnormal_individual:
-                        [x, y, w, h] = list(map(int, track.to_tlbr().tolist()))
-                        cv2.rectangle(frame, (x , y ), (w, h), RGB_COLORS["blue"], 5)
-            else:
-                ab_warning_timeout -= 1
-            if ab_warning_timeout > 0:
-                if display_frame_count % 3 != 0:
-                    cv2.putText(frame, "ABNORMAL ACTIVITY", (130, 250),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1.5, RGB_COLORS["blue"], 5)
-
-        # Display crowd count on screen
-        if SHOW_DETECT:
-            text = "Crowd count: {}".format(len(humans_detected))
-            cv2.putText(frame, text, (10, 30),
-                cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 3)
-        
-        # Record crowd data to file
-        if DATA_RECORD:
-            _record_crowd_data(record_time, len(humans_detected), len(violate_set), RE, ABNORMAL, crowd_data_writer)
+        # Check for restricted entry, social distance and abnormal activity
+        analyse_frame(frame, humans_detected, current_datetime, record_time, TIME_STEP, state, crowd_data_writer)
 
         # Display video output or processing indicator
         if SHOW_PROCESSING_OUTPUT:
             cv2.imshow("Processed Output", frame)
         else:
-            progress(display_frame_count)
+            progress(state["display_frame_count"])
+
+        # Measure time from frame capture until its alerts are out
+        if LATEST_FRAME:
+            latency = time.time() - reader.capture_time
+            latencies.append(latency)
+            if latency_data_writer is not None:
+                # Frames dropped since the previous one
+                _record_latency_data(record_time, latency, consumed - 1, latency_data_writer)
+
+        # Change the stride if processing is falling behind or ahead
+        if controller is not None:
+            new_stride = controller.update(time.time() - loop_start, len(humans_detected))
+            if new_stride is not None:
+                max_age = min(30, ceil(TRACK_MAX_AGE * VID_FPS / new_stride))
+                print("\nFrame {}: stride changed to {} (frame cost {:.3f}s, crowd count {}, track max age {})".format(
+                    frame_count, new_stride, controller.cost, len(humans_detected), max_age))
+                reader.set_stride(new_stride)
+                tracker.set_max_age(max_age)
 
         # Press 'Q' to stop the video display
         if cv2.waitKey(1) & 0xFF == ord('q'):
             # Record the movement when video ends
-            _end_video(tracker, frame_count, movement_data_writer)
+            end_video(tracker, frame_count, movement_data_writer, RECORD_FRAME)
             # Compute the processing speed
             if not VID_FPS:
                 _calculate_FPS()
             break
+
+    if pipeline is not None:
+        pipeline.close()
+    reader.close()
+    if reader.stats():
+        print("Reader stats: ", reader.stats())
+    if gate is not None:
+        print("Motion gate stats: ", gate.stats())
+    if cache is not None:
+        cache.close()
+        print("Detection cache stats: ", cache.stats())
+    if size_policy is not None:
+        print("Inference size stats: ", size_policy.stats())
+    if tracker.lazy_features:
+        print("Lazy feature stats: ", {"encoded": tracker.encoded, "skipped": tracker.skipped})
+    _print_latency(latencies)
     
     cv2.destroyAllWindows()
     return VID_FPS
\ No newline at end of file
@@ -0,0 +1,290 @@
+import time
+import threading
+from collections import deque
+import cv2
+from config import CPU_CONFIG
+
+SEEK_MIN_STRIDE = CPU_CONFIG["SEEK_MIN_STRIDE"]
+
+class FrameReader:
+    """Decode only the frames the processing loop will use.
+
+    Every call to `read` consumes `stride` frames from the capture and
+    returns the last one. Skipped frames are either `grab()`-ed without
+    `retrieve()` (no pixel conversion), or, for file sources with a large
+    enough stride, jumped over with a single seek.
+    """
+
+    resizes = False
+
+    def __init__(self, cap, stride, is_cam):
+        self.cap = cap
+        self.is_cam = is_cam
+        self.set_stride(stride)
+        self.position = 0
+        self.total_frames = 0 if is_cam else int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def set_stride(self, stride):
+        self.stride = max(1, int(stride))
+        # Seeking is only possible on files, and only pays off for big strides
+        self.use_seek = (not self.is_cam) and SEEK_MIN_STRIDE > 0 and self.stride >= SEEK_MIN_STRIDE
+
+    def _grab(self, count):
+        # Advance without decoding into a BGR image
+        grabbed = 0
+        for _ in range(count):
+            if not self.cap.grab():
+                break
+            grabbed += 1
+        return grabbed
+
+    def _seek(self, count):
+        target = self.position + count
+        if self.total_frames > 0 and target >= self.total_frames:
+            return None
+        if not self.cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+            return None
+        return count
+
+    def read(self):
+        """Return `(ret, frame, consumed)` where `consumed` is the number of
+        frames advanced in the source, including the returned one.
+        """
+        skip = self.stride - 1
+        skipped = None
+        if skip > 0 and self.use_seek:
+            skipped = self._seek(skip)
+        if skipped is None:
+            skipped = self._grab(skip)
+            if skipped < skip:
+                self.position += skipped
+                return False, None, skipped
+
+        (ret, frame) = self.cap.read()
+        consumed = skipped + 1 if ret else skipped
+        self.position += consumed
+        return ret, frame, consumed
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return None
+
+
+def resize_to_width(frame, width, dst=None):
+    # Same output size and interpolation as imutils.resize(frame, width=width)
+    (h, w) = frame.shape[:2]
+    dim = (width, int(h * (width / float(w))))
+    return cv2.resize(frame, dim, dst=dst, interpolation=cv2.INTER_AREA)
+
+
+class PrefetchReader:
+    """Decode and resize frames on a background thread.
+
+    Frames are written into a ring of `hold + depth` preallocated buffers,
+    so up to `depth` frames are decoded ahead. `read` hands out one buffer at
+    a time; it stays valid (and may be drawn on) for the next `hold - 1`
+    calls to `read`. When the ring is full, file sources make
+    the decode thread wait, while camera sources drop the oldest queued
+    frame so the decode thread keeps draining the device.
+    """
+
+    resizes = True
+
+    def __init__(self, reader, frame_size, depth, is_cam, hold=1):
+        self.reader = reader
+        self.frame_size = frame_size
+        self.hold = max(1, int(hold))
+        self.depth = max(1, int(depth))
+        self.is_cam = is_cam
+
+        # Held frames do not count against the frames decoded ahead
+        self.slots = [None] * (self.hold + self.depth)
+        self.free = deque(range(len(self.slots)))
+        self.ready = deque()
+        self.held = deque()
+        self.stopped = False
+        self.error = None
+        self.cond = threading.Condition()
+
+        # Stats
+        self.reads = 0
+        self.depth_total = 0
+        self.depth_max = 0
+        self.read_stall = 0.
+        self.decode_stall = 0.
+        self.dropped = 0
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            self._decode()
+        except Exception as e:
+            # Hand the error to the processing thread, it would wait forever otherwise
+            with self.cond:
+                self.error = e
+                self.ready.append((None, 0))
+                self.cond.notify_all()
+
+    def _decode(self):
+        while True:
+            (ret, frame, consumed) = self.reader.read()
+            with self.cond:
+                if self.stopped:
+                    return
+                if not ret:
+                    # End of stream marker
+                    self.ready.append((None, consumed))
+                    self.cond.notify_all()
+                    return
+                t0 = time.time()
+                while not self.free and not self.stopped:
+                    if self.is_cam and self.ready:
+                        # Drop the oldest frame, keep its frame count
+                        (idx, dropped_consumed) = self.ready.popleft()
+                        self.free.append(idx)
+                        consumed += dropped_consumed
+                        self.dropped += 1
+                    else:
+                        self.cond.wait()
+                self.decode_stall += time.time() - t0
+                if self.stopped:
+                    return
+                idx = self.free.popleft()
+
+            # The slot is owned by this thread until it is queued
+            out = resize_to_width(frame, self.frame_size, dst=self.slots[idx])
+            self.slots[idx] = out
+
+            with self.cond:
+                self.ready.append((idx, consumed))
+                self.cond.notify_all()
+
+    def set_stride(self, stride):
+        # Applies to frames decoded from now on, buffered frames keep theirs
+        self.reader.set_stride(stride)
+
+    def has_frame(self):
+        """Return True if `read` would return without waiting."""
+        with self.cond:
+            return len(self.ready) > 0
+
+    def read(self):
+        """Return `(ret, frame, consumed)` like `FrameReader.read`, with the
+        frame already resized to `frame_size`. An error raised while decoding
+        is raised here.
+        """
+        with self.cond:
+            if len(self.held) >= self.hold:
+                self.free.append(self.held.popleft())
+                self.cond.notify_all()
+            queued = len(self.ready)
+            self.reads += 1
+            self.depth_total += queued
+            self.depth_max = max(self.depth_max, queued)
+            t0 = time.time()
+            while not self.ready:
+                self.cond.wait()
+            self.read_stall += time.time() - t0
+            (idx, consumed) = self.ready.popleft()
+            if idx is None:
+                if self.error is not None:
+                    raise self.error
+                return False, None, consumed
+            self.held.append(idx)
+            return True, self.slots[idx], consumed
+
+    def close(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        self.thread.join(timeout=1)
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "avg_queue_depth": round(self.depth_total / max(1, self.reads), 2),
+            "max_queue_depth": self.depth_max,
+            "read_stall_sec": round(self.read_stall, 3),
+            "decode_stall_sec": round(self.decode_stall, 3),
+            "dropped_frames": self.dropped
+        }
+
+
+class LatestFrameReader:
+    """Always hand out the newest frame of a live camera.
+
+    A background thread keeps reading the device so its internal buffer
+    never fills up. `read` returns the most recent frame and skips the ones
+    that arrived while the previous frame was being processed. The capture
+    time of the returned frame is kept in `capture_time`.
+    """
+
+    resizes = True
+
+    def __init__(self, cap, frame_size):
+        self.cap = cap
+        self.frame_size = frame_size
+
+        self.frame = None
+        self.frame_time = None
+        self.capture_time = None
+        self.seq = 0
+        self.last_seq = 0
+        self.ended = False
+        self.stopped = False
+        self.cond = threading.Condition()
+
+        # Stats
+        self.dropped = 0
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped:
+            (ret, frame) = self.cap.read()
+            t = time.time()
+            with self.cond:
+                if not ret:
+                    self.ended = True
+                    self.cond.notify_all()
+                    return
+                self.frame = frame
+                self.frame_time = t
+                self.seq += 1
+                self.cond.notify_all()
+
+    def read(self):
+        """Return `(ret, frame, consumed)` like `FrameReader.read`, where
+        `consumed - 1` frames were dropped since the previous call.
+        """
+        with self.cond:
+            while self.seq == self.last_seq and not self.ended:
+                self.cond.wait()
+            if self.seq == self.last_seq:
+                return False, None, 0
+            consumed = self.seq - self.last_seq
+            self.dropped += consumed - 1
+            self.last_seq = self.seq
+            frame = self.frame
+            self.capture_time = self.frame_time
+        return True, resize_to_width(frame, self.frame_size), consumed
+
+    def has_frame(self):
+        """Return True if `read` would return without waiting."""
+        with self.cond:
+            return self.seq != self.last_seq or self.ended
+
+    def close(self):
+        self.stopped = True
+        self.thread.join(timeout=1)
+
+    def stats(self):
+        return {
+            "processed_frames": self.last_seq - self.dropped,
+            "dropped_frames": self.dropped
+        }
@@ -1,48 +1,75 @@
-import torch
+import os
 import numpy as np
 from ultralytics import YOLO
 from config import YOLO_CONFIG, MIN_CONF
+from deep_sort.detection import DETECTION_DTYPE
+from model_registry import int8_path, export_path, EXPORT_SUFFIX
+
+def export_model(model_path, backend):
+    path = export_path(model_path, backend)
+    if not os.path.exists(path):
+        # Export once, with a dynamic batch size for detect_batch
+        print("Exporting {} to {}, this is only done once...".format(model_path, backend))
+        YOLO(model_path).export(format=backend, dynamic=True)
+    return path
+
+def load_model(model_path, backend, device, precision="fp32"):
+    if precision == "int8":
+        path = int8_path(model_path)
+        if not os.path.exists(path):
+            raise FileNotFoundError("{} not found, run quantize.py to create it".format(path))
+        return YOLO(path, task="detect")
+    if backend == "torch":
+        model = YOLO(model_path)
+        model.to(device)
+        # Optimize model
+        model.fuse()
+        return model
+    if backend not in EXPORT_SUFFIX:
+        raise ValueError("Unknown YOLO backend: {}".format(backend))
+    return YOLO(export_model(model_path, backend), task="detect")
 
 class YOLOv8Detector:
-    def __init__(self):
-        # Configure CPU optimization
-        torch.set_num_threads(4)  # Adjust based on your CPU cores
-        
-        # Load model
-        self.model = YOLO(YOLO_CONFIG["MODEL_PATH"])
-        self.model.to(YOLO_CONFIG["DEVICE"])
+    def __init__(self, backend=None, precision=None, img_size=None):
+        # Thread counts are set at startup from THREAD_CONFIG, see autotune.py
         
-        # Optimize model
-        self.model.fuse()
+        # Load model, the settings in YOLO_CONFIG are used unless given
+        self.backend = backend or YOLO_CONFIG["BACKEND"]
+        self.precision = precision or YOLO_CONFIG["PRECISION"]
+        self.img_size = img_size or YOLO_CONFIG["IMG_SIZE"]
+        self.model = load_model(YOLO_CONFIG["MODEL_PATH"], self.backend, YOLO_CONFIG["DEVICE"], self.precision)
         self.conf_thresh = MIN_CONF
+
+    def _parse_result(self, result):
+        # Fill one record per box straight from the result tensors
+        xyxy = result.boxes.xyxy.cpu().numpy().astype(int).reshape(-1, 4)
+        detections = np.empty(len(xyxy), dtype=DETECTION_DTYPE)
+        detections["confidence"] = result.boxes.conf.cpu().numpy().reshape(-1)
         
-    def detect(self, frame):
-        # Run inference
-        results = self.model(frame, 
-                           classes=0,  # Person class only 
-                           conf=self.conf_thresh,
-                           verbose=False)
+        # Boxes as (x, y, w, h)
+        tlwh = detections["tlwh"]
+        tlwh[:] = xyxy
+        tlwh[:, 2:] -= xyxy[:, :2]
         
-        # Process detections
-        boxes = []
-        confidences = []
-        centroids = []
+        # Calculate centroids
+        detections["centroid"] = xyxy[:, :2] + tlwh[:, 2:] / 2
         
-        # Extract detection information
-        for result in results:
-            for box in result.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                confidence = float(box.conf)
-                
-                # Calculate width and height
-                w, h = x2 - x1, y2 - y1
-                
-                # Calculate centroid
-                centroid = (int(x1 + w/2), int(y1 + h/2))
-                
-                # Add to lists
-                boxes.append([x1, y1, w, h])
-                confidences.append(confidence)
-                centroids.append(centroid)
+        return detections
         
-        return boxes, confidences, centroids
\ No newline at end of file
+    def detect(self, frame):
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames, img_size=None):
+        """Run a single inference call over several frames, at `img_size`
+        if given instead of the configured size. Returns one array of
+        `DETECTION_DTYPE` records per frame, with boxes as `(x, y, w, h)`.
+        """
+        if len(frames) == 0:
+            return []
+        results = self.model(list(frames),
+                           classes=0,  # Person class only
+                           conf=self.conf_thresh,
+                           imgsz=img_size or self.img_size,
+                           device=YOLO_CONFIG["DEVICE"],
+                           verbose=False)
+        return [self._parse_result(result) for result in results]